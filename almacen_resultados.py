@@ -0,0 +1,288 @@
+# ============================================================
+# 🗄️ Almacén SQLite de resultados (historial de ejecuciones)
+# Cada ejecución de calcular_info_nutricional se agrega con sus metadatos,
+# el detalle por ingrediente y los totales por receta
+# ============================================================
+
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from calculo_nutricional_recetas import CLAVES_RECETA, REPORTS_DIR, columnas_nutrientes, totales_por_receta
+
+DB_PATH = REPORTS_DIR / "historial_resultados.sqlite"
+
+# Filtros del dashboard que se resuelven en SQL (todos indexados)
+COLUMNAS_FILTRO = ["ut", "tipo_receta", "grupo_etareo_recet", "nombre_de_receta"]
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ejecuciones (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha TEXT NOT NULL,
+    fuente_recetas TEXT,
+    fuente_tpca TEXT,
+    filas INTEGER,
+    columnas INTEGER,
+    ingredientes_sin_match INTEGER,
+    orden_columnas TEXT
+);
+CREATE TABLE IF NOT EXISTS ingredientes (
+    run_id INTEGER NOT NULL REFERENCES ejecuciones(run_id),
+    fila INTEGER NOT NULL,
+    ut TEXT, tipo_receta TEXT, grupo_etareo_recet TEXT, nombre_de_receta TEXT
+);
+CREATE TABLE IF NOT EXISTS recetas (
+    run_id INTEGER NOT NULL REFERENCES ejecuciones(run_id),
+    ut TEXT, tipo_receta TEXT, grupo_etareo_recet TEXT, nombre_de_receta TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_ing_ut ON ingredientes(run_id, ut);
+CREATE INDEX IF NOT EXISTS idx_ing_tipo ON ingredientes(run_id, tipo_receta);
+CREATE INDEX IF NOT EXISTS idx_ing_grupo ON ingredientes(run_id, grupo_etareo_recet);
+CREATE INDEX IF NOT EXISTS idx_ing_receta ON ingredientes(run_id, nombre_de_receta);
+CREATE INDEX IF NOT EXISTS idx_rec_ut ON recetas(run_id, ut);
+CREATE INDEX IF NOT EXISTS idx_rec_tipo ON recetas(run_id, tipo_receta);
+CREATE INDEX IF NOT EXISTS idx_rec_grupo ON recetas(run_id, grupo_etareo_recet);
+CREATE INDEX IF NOT EXISTS idx_rec_receta ON recetas(run_id, nombre_de_receta, ut, tipo_receta, grupo_etareo_recet);
+"""
+
+
+# ------------ utilidades ------------
+def _q(col: str) -> str:
+    """Nombre de columna entre comillas dobles (las columnas TPCA traen caracteres como μ)."""
+    return '"' + str(col).replace('"', '""') + '"'
+
+
+def _conectar(db_path=None) -> sqlite3.Connection:
+    # DB_PATH se resuelve al llamar (permite redirigir el almacén, p. ej. en pruebas de carga)
+    db_path = db_path or DB_PATH
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(db_path)
+    # WAL: las lecturas (dashboard) no quedan bloqueadas mientras una ejecución larga escribe
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript(_ESQUEMA)
+    return con
+
+
+def _asegurar_columnas(con: sqlite3.Connection, tabla: str, df: pd.DataFrame) -> None:
+    """Agrega a la tabla las columnas nuevas del DataFrame (los nutrientes pueden variar entre ejecuciones)."""
+    existentes = {r[1] for r in con.execute(f"PRAGMA table_info({tabla})")}
+    for col, dtype in df.dtypes.items():
+        if col in existentes:
+            continue
+        tipo = "REAL" if pd.api.types.is_numeric_dtype(dtype) else ""
+        con.execute(f"ALTER TABLE {tabla} ADD COLUMN {_q(col)} {tipo}")
+
+
+def _insertar(con: sqlite3.Connection, tabla: str, df: pd.DataFrame) -> None:
+    _asegurar_columnas(con, tabla, df)
+    cols = ", ".join(_q(c) for c in df.columns)
+    marcas = ", ".join("?" for _ in df.columns)
+    filas = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    con.executemany(f"INSERT INTO {tabla} ({cols}) VALUES ({marcas})", filas)
+
+
+def _where(run_id: int, filtros: dict) -> tuple[str, list]:
+    condiciones, params = ["run_id = ?"], [run_id]
+    for col, valores in filtros.items():
+        if col not in COLUMNAS_FILTRO:
+            raise ValueError(f"Filtro no soportado: '{col}'")
+        if valores:
+            valores = list(valores)
+            condiciones.append(f"{_q(col)} IN ({', '.join('?' for _ in valores)})")
+            params.extend(valores)
+    return " AND ".join(condiciones), params
+
+
+# ------------ escritura ------------
+class RegistroEjecucion:
+    """
+    Registro de una ejecución por partes (para el pipeline por bloques):
+
+        with RegistroEjecucion(meta, columnas) as registro:
+            registro.agregar_ingredientes(bloque)   # tantas veces como bloques
+            registro.registrar_recetas(df_totales)
+
+    Filas, columnas y sin_match se actualizan al salir, todo en una sola transacción:
+    si hay un error no queda nada registrado.
+    """
+
+    def __init__(self, meta: dict | None = None, columnas: list[str] | None = None, db_path=None):
+        self.meta = meta or {}
+        self.columnas = [str(c) for c in columnas] if columnas is not None else None
+        self.db_path = db_path
+        self.run_id = None
+        self.filas = 0
+        self._con = None
+
+    def __enter__(self) -> "RegistroEjecucion":
+        self._con = _conectar(self.db_path)
+        cur = self._con.execute(
+            "INSERT INTO ejecuciones (fecha, fuente_recetas, fuente_tpca, filas, columnas, ingredientes_sin_match, "
+            "orden_columnas) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                self.meta.get("fecha_proceso", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+                self.meta.get("fuente_recetas"), self.meta.get("fuente_tpca"),
+                0, None, None, None,
+            ),
+        )
+        self.run_id = cur.lastrowid
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        try:
+            if exc_type is None:
+                self._con.execute(
+                    "UPDATE ejecuciones SET filas = ?, columnas = ?, ingredientes_sin_match = ?, orden_columnas = ? "
+                    "WHERE run_id = ?",
+                    (
+                        self.filas, len(self.columnas) if self.columnas else None,
+                        self.meta.get("ingredientes_sin_match"),
+                        json.dumps(self.columnas, ensure_ascii=False) if self.columnas else None,
+                        self.run_id,
+                    ),
+                )
+                self._con.commit()
+            else:
+                self._con.rollback()
+        finally:
+            self._con.close()
+
+    def agregar_ingredientes(self, df: pd.DataFrame) -> None:
+        df = df.copy()
+        df.insert(0, "fila", range(self.filas, self.filas + len(df)))
+        df.insert(0, "run_id", self.run_id)
+        _insertar(self._con, "ingredientes", df)
+        self.filas += len(df)
+
+    def registrar_recetas(self, df_recetas: pd.DataFrame) -> None:
+        df = df_recetas.copy()
+        df.insert(0, "run_id", self.run_id)
+        _insertar(self._con, "recetas", df)
+
+
+def registrar_ejecucion(df_final: pd.DataFrame, meta: dict | None = None, db_path=None) -> int:
+    """
+    Agrega una ejecución al historial: metadatos, detalle por ingrediente y totales por receta.
+    Devuelve el run_id asignado.
+    """
+    df_recetas = totales_por_receta(df_final, columnas_nutrientes(df_final))
+    with RegistroEjecucion(meta, list(df_final.columns), db_path) as registro:
+        registro.agregar_ingredientes(df_final)
+        registro.registrar_recetas(df_recetas)
+    return registro.run_id
+
+
+# ------------ consultas ------------
+def listar_ejecuciones(db_path=None) -> pd.DataFrame:
+    """Historial de ejecuciones, de la más reciente a la más antigua."""
+    if not Path(db_path or DB_PATH).exists():
+        return pd.DataFrame(columns=["run_id", "fecha", "fuente_recetas", "fuente_tpca", "filas",
+                                     "columnas", "ingredientes_sin_match"])
+    con = _conectar(db_path)
+    try:
+        return pd.read_sql_query(
+            "SELECT run_id, fecha, fuente_recetas, fuente_tpca, filas, columnas, ingredientes_sin_match "
+            "FROM ejecuciones ORDER BY run_id DESC", con
+        )
+    finally:
+        con.close()
+
+
+def valores_distintos(run_id: int, columna: str, db_path=None) -> list:
+    """Valores únicos de una columna de filtro (resuelto con el índice correspondiente)."""
+    if columna not in COLUMNAS_FILTRO:
+        raise ValueError(f"Filtro no soportado: '{columna}'")
+    con = _conectar(db_path)
+    try:
+        filas = con.execute(
+            f"SELECT DISTINCT {_q(columna)} FROM recetas WHERE run_id = ? AND {_q(columna)} IS NOT NULL "
+            f"ORDER BY {_q(columna)}", (run_id,)
+        ).fetchall()
+    finally:
+        con.close()
+    return [f[0] for f in filas]
+
+
+def _consultar(tabla: str, run_id: int, columnas: list[str] | None, filtros: dict, orden_por: str, db_path) -> pd.DataFrame:
+    where, params = _where(run_id, filtros)
+    con = _conectar(db_path)
+    try:
+        if columnas is None and tabla == "ingredientes":
+            # Mismo orden de columnas que el resultado original (nutrientes después de las 20 informativas)
+            orden = con.execute("SELECT orden_columnas FROM ejecuciones WHERE run_id = ?", (run_id,)).fetchone()
+            columnas = json.loads(orden[0]) if orden and orden[0] else None
+        if columnas is None:
+            columnas = [r[1] for r in con.execute(f"PRAGMA table_info({tabla})") if r[1] not in ("run_id", "fila")]
+        select = ", ".join(_q(c) for c in columnas)
+        return pd.read_sql_query(f"SELECT {select} FROM {tabla} WHERE {where} ORDER BY {orden_por}", con, params=params)
+    finally:
+        con.close()
+
+
+def consultar_ingredientes(run_id: int, columnas: list[str] | None = None, db_path=None, **filtros) -> pd.DataFrame:
+    """Detalle por ingrediente de una ejecución, con filtros (ut=[...], tipo_receta=[...], ...) resueltos en SQL."""
+    return _consultar("ingredientes", run_id, columnas, filtros, "fila", db_path)
+
+
+def consultar_recetas(run_id: int, columnas: list[str] | None = None, db_path=None, **filtros) -> pd.DataFrame:
+    """Totales por receta de una ejecución, con filtros resueltos en SQL."""
+    return _consultar("recetas", run_id, columnas, filtros, "nombre_de_receta", db_path)
+
+
+def diferencias_entre_ejecuciones(run_a: int, run_b: int, nutrientes: list[str], tolerancia: float = 1e-6,
+                                  db_path=None, **filtros) -> pd.DataFrame:
+    """
+    Recetas cuyos nutrientes cambiaron entre `run_a` (anterior) y `run_b` (nueva).
+
+    Devuelve una fila por (receta, nutriente) con valor_anterior, valor_nuevo y diferencia.
+    Las recetas que solo existen en una de las dos ejecuciones aparecen con el otro valor vacío.
+    """
+    if not nutrientes:
+        return pd.DataFrame(columns=CLAVES_RECETA + ["nutriente", "valor_anterior", "valor_nuevo", "diferencia"])
+    where_a, params_a = _where(run_a, filtros)
+    where_b, params_b = _where(run_b, filtros)
+    claves = ", ".join(_q(c) for c in CLAVES_RECETA)
+    union = " AND ".join(f"a.{_q(c)} IS b.{_q(c)}" for c in CLAVES_RECETA)
+    valores_a = ", ".join(f"a.{_q(n)} AS {_q(n + '__a')}" for n in nutrientes)
+    valores_b = ", ".join(f"b.{_q(n)} AS {_q(n + '__b')}" for n in nutrientes)
+    cambio = " OR ".join(
+        f"abs(coalesce(b.{_q(n)}, 0) - coalesce(a.{_q(n)}, 0)) > {float(tolerancia)}" for n in nutrientes
+    )
+    claves_a = ", ".join(f"a.{_q(c)} AS {_q(c)}" for c in CLAVES_RECETA)
+    claves_b = ", ".join(f"b.{_q(c)} AS {_q(c)}" for c in CLAVES_RECETA)
+
+    sql = f"""
+    WITH a AS (SELECT * FROM recetas WHERE {where_a}),
+         b AS (SELECT * FROM recetas WHERE {where_b})
+    SELECT {claves_a}, a.run_id AS en_a, b.run_id AS en_b, {valores_a}, {valores_b}
+    FROM a LEFT JOIN b ON {union}
+    WHERE b.run_id IS NULL OR ({cambio})
+    UNION ALL
+    SELECT {claves_b}, NULL AS en_a, b.run_id AS en_b, {', '.join(f'NULL AS {_q(n + "__a")}' for n in nutrientes)}, {valores_b}
+    FROM b LEFT JOIN a ON {union}
+    WHERE a.run_id IS NULL
+    ORDER BY {claves}
+    """
+    con = _conectar(db_path)
+    try:
+        wide = pd.read_sql_query(sql, con, params=params_a + params_b)
+    finally:
+        con.close()
+
+    partes = []
+    for n in nutrientes:
+        parte = wide[CLAVES_RECETA].copy()
+        parte["nutriente"] = n
+        parte["valor_anterior"] = wide[n + "__a"]
+        parte["valor_nuevo"] = wide[n + "__b"]
+        parte["_solo_un_lado"] = wide["en_a"].isna() | wide["en_b"].isna()
+        partes.append(parte)
+    largo = pd.concat(partes, ignore_index=True)
+    largo["diferencia"] = largo["valor_nuevo"].fillna(0) - largo["valor_anterior"].fillna(0)
+    cambiado = (largo["diferencia"].abs() > tolerancia) | largo.pop("_solo_un_lado")
+    return largo[cambiado].sort_values(CLAVES_RECETA + ["nutriente"], kind="stable").reset_index(drop=True)
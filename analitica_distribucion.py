@@ -0,0 +1,128 @@
+# ============================================================
+# 📈 Distribución de nutrientes por UT / tipo de receta / grupo etáreo
+# Ej: "mediana y p10–p90 de hierro por receta en la UT X, y % de recetas bajo la meta"
+# ============================================================
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from calculo_nutricional_recetas import COL_PESO, columnas_nutrientes, totales_por_receta
+from factores_retencion import COL_PESO_COCIDO
+
+# Columnas de agrupación del panel
+CLAVES_GRUPO = ["ut", "tipo_receta", "grupo_etareo_recet"]
+CUANTILES = {0.1: "p10", 0.5: "mediana", 0.9: "p90"}
+N_BINS = 20
+
+
+class DistribucionNutrientes:
+    """
+    Precalcula, una vez por resultado, sobre los totales por receta:
+    - `cuantiles`: por grupo (UT × tipo × grupo etáreo) y nutriente: n, media, p10, mediana, p90
+    - `conteos`: histogramas por grupo (grupos × nutrientes × N_BINS) con bordes comunes por
+      nutriente, de modo que varios grupos filtrados se combinan sumando conteos
+
+    Se construye desde el resultado por ingrediente o, con `desde_totales`, desde los totales
+    por receta que ya devuelve el cálculo por bloques.
+    """
+
+    def __init__(self, df_final: pd.DataFrame, nutri_cols: list[str] | None = None):
+        if nutri_cols is None:
+            nutri_cols = columnas_nutrientes(df_final)
+        self._preparar(totales_por_receta(df_final, nutri_cols), nutri_cols)
+
+    @classmethod
+    def desde_totales(cls, totales: pd.DataFrame, nutri_cols: list[str] | None = None) -> "DistribucionNutrientes":
+        if nutri_cols is None:
+            nutri_cols = [c for c in totales.columns if pd.api.types.is_numeric_dtype(totales[c])]
+        obj = cls.__new__(cls)
+        obj._preparar(totales, nutri_cols)
+        return obj
+
+    def _preparar(self, totales: pd.DataFrame, nutri_cols: list[str]) -> None:
+        self.nutri_cols = [c for c in nutri_cols if c in totales.columns and c not in (COL_PESO, COL_PESO_COCIDO)]
+        self.claves = [c for c in CLAVES_GRUPO if c in totales.columns]
+        if not self.claves:
+            raise ValueError("No se detectaron columnas de agrupación (ut / tipo_receta / grupo_etareo_recet).")
+        self.totales = totales[self.claves + self.nutri_cols].reset_index(drop=True)
+
+        grupos = self.totales.groupby(self.claves, sort=True, dropna=False)
+        gid = grupos.ngroup().to_numpy()
+        self.grupos = grupos.size().rename("n_recetas").reset_index()
+
+        # Cuantiles y medias: una sola operación agrupada para todos los nutrientes
+        q = grupos[self.nutri_cols].quantile(list(CUANTILES))
+        q.index = q.index.set_names(self.claves + ["cuantil"])
+        largo = q.reset_index().melt(id_vars=self.claves + ["cuantil"], var_name="nutriente", value_name="valor")
+        cuantiles = largo.set_index(self.claves + ["nutriente", "cuantil"])["valor"].unstack("cuantil")
+        cuantiles = cuantiles.rename(columns=CUANTILES)
+        medias = grupos[self.nutri_cols].mean().reset_index().melt(
+            id_vars=self.claves, var_name="nutriente", value_name="media"
+        )
+        cuantiles = cuantiles.join(medias.set_index(self.claves + ["nutriente"])["media"])
+        self.cuantiles = (
+            cuantiles.reset_index()
+            .merge(self.grupos, on=self.claves, how="left")
+            [self.claves + ["nutriente", "n_recetas", "media"] + list(CUANTILES.values())]
+        )
+
+        # Histogramas: bordes comunes por nutriente y un único bincount para todos los grupos
+        valores = self.totales[self.nutri_cols].to_numpy(dtype=float)
+        validos = ~np.isnan(valores)
+        minimo = np.where(validos, valores, np.inf).min(axis=0, initial=np.inf)
+        maximo = np.where(validos, valores, -np.inf).max(axis=0, initial=-np.inf)
+        minimo = np.where(np.isfinite(minimo), minimo, 0.0)
+        maximo = np.where(np.isfinite(maximo) & (maximo > minimo), maximo, minimo + 1.0)
+        self.bordes = minimo[:, None] + (maximo - minimo)[:, None] * np.linspace(0, 1, N_BINS + 1)
+
+        with np.errstate(invalid="ignore"):
+            relativo = (valores - minimo) / (maximo - minimo) * N_BINS
+        bins = np.clip(np.nan_to_num(relativo, nan=0).astype(int), 0, N_BINS - 1)
+        n_grupos, n_nutri = len(self.grupos), len(self.nutri_cols)
+        plano = (gid[:, None] * n_nutri + np.arange(n_nutri)) * N_BINS + bins
+        self.conteos = np.bincount(plano[validos], minlength=n_grupos * n_nutri * N_BINS).reshape(
+            n_grupos, n_nutri, N_BINS
+        )
+        self._col_idx = {c: i for i, c in enumerate(self.nutri_cols)}
+
+    def _indice(self, nutriente: str) -> int:
+        if nutriente not in self._col_idx:
+            raise ValueError(f"El nutriente '{nutriente}' no está en el resultado.")
+        return self._col_idx[nutriente]
+
+    @staticmethod
+    def _mascara(df: pd.DataFrame, filtros: dict) -> np.ndarray:
+        mascara = np.ones(len(df), dtype=bool)
+        for col, valores in filtros.items():
+            if valores and col in df.columns:
+                mascara &= df[col].isin(list(valores)).to_numpy()
+        return mascara
+
+    def histograma(self, nutriente: str, **filtros) -> pd.DataFrame:
+        """Histograma del nutriente para los grupos que pasan los filtros (suma de conteos precalculados)."""
+        j = self._indice(nutriente)
+        conteo = self.conteos[self._mascara(self.grupos, filtros), j, :].sum(axis=0)
+        return pd.DataFrame({"desde": self.bordes[j, :-1], "hasta": self.bordes[j, 1:], "recetas": conteo})
+
+    def resumen(self, nutriente: str, meta: float | None = None, **filtros) -> pd.DataFrame:
+        """
+        Cuantiles por grupo para un nutriente. Con `meta`, agrega `pct_bajo_meta`: % de recetas
+        del grupo cuyo total por ración queda por debajo de la meta.
+        """
+        self._indice(nutriente)
+        out = self.cuantiles[
+            (self.cuantiles["nutriente"] == nutriente).to_numpy() & self._mascara(self.cuantiles, filtros)
+        ].drop(columns="nutriente")
+        if meta is not None:
+            sel = self.totales[self._mascara(self.totales, filtros)]
+            bajo = (sel[nutriente] < meta).groupby([sel[c] for c in self.claves], dropna=False).mean() * 100
+            out = out.merge(bajo.rename("pct_bajo_meta").reset_index(), on=self.claves, how="left")
+        return out.reset_index(drop=True)
+
+    def pct_bajo_meta(self, nutriente: str, meta: float, **filtros) -> float:
+        """% de recetas (de todos los grupos filtrados) por debajo de la meta."""
+        valores = self.totales[nutriente].to_numpy(dtype=float)[self._mascara(self.totales, filtros)]
+        valores = valores[~np.isnan(valores)]
+        return float((valores < meta).mean() * 100) if len(valores) else float("nan")
@@ -4,10 +4,23 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
+import sqlite3
+import tempfile
 from pathlib import Path
 from io import BytesIO
 from clean_recetas_calculo import limpiar_recetas as procesar_excel_recetas
-from calculo_nutricional_recetas import calcular_info_nutricional
+from calculo_nutricional_recetas import calcular_info_nutricional, cargar_tpca, leer_publicacion, totales_por_receta
+from sustitucion_ingredientes import SimuladorSustitucion, COLUMNAS_SUSTITUCION
+from ranking_nutrientes import RankingNutrientes, BASES
+from analitica_distribucion import DistribucionNutrientes
+from exportar_excel import leer_hoja_streaming
+from planificacion_compras import PlanificadorCompras, exportar_compras
+from factores_retencion import COL_PESO_COCIDO, SUFIJO_RETENIDO, cargar_factores
+from optimizador_menus import NUTRIENTES_META, cargar_metas, costos_desde_tabla, metas_de_grupo, optimizar_menu
+from almacen_resultados import (
+    listar_ejecuciones, consultar_ingredientes, consultar_recetas, diferencias_entre_ejecuciones, valores_distintos,
+)
 
 
 # ============================================================
@@ -173,6 +186,9 @@ PRETTY_MAP = {
     "sodiona_mg": "Sodio (mg)",
     "potasiok_mg": "Potasio (mg)",
 }
+# Valores con factores de retención (cuando existe data/processed/factores_retencion.csv)
+PRETTY_MAP.update({f"{k}{SUFIJO_RETENIDO}": f"{v} retenido" for k, v in list(PRETTY_MAP.items()) if k.endswith(("_kcal", "_g", "_mg", "_μg")) and k != "peso_neto__racion_g"})
+PRETTY_MAP[COL_PESO_COCIDO] = "Peso cocido (g)"
 PRETTY_TO_INTERNAL = {v: k for k, v in PRETTY_MAP.items()}
 
 def rename_for_display(df: pd.DataFrame) -> pd.DataFrame:
@@ -181,6 +197,17 @@ def rename_for_display(df: pd.DataFrame) -> pd.DataFrame:
 def to_internal(cols_display: list[str]) -> list[str]:
     return [PRETTY_TO_INTERNAL.get(c, c) for c in cols_display]
 
+@st.cache_data
+def cargar_tpca_cache():
+    return cargar_tpca()
+
+def usar_distribucion_publicada(publicacion, df):
+    # Las distribuciones se calcularon junto al resultado publicado: no se recalculan en la sesión
+    ruta = (publicacion or {}).get("distribuciones")
+    if ruta and Path(ruta).exists():
+        st.session_state["distribucion"] = pd.read_pickle(ruta)
+        st.session_state["distribucion_base"] = df
+
 # ============================================================
 # 📤 CARGA Y PROCESAMIENTO
 # ============================================================
@@ -205,15 +232,52 @@ if st.sidebar.button("🔄 Calcular información nutricional"):
     with st.spinner("Calculando información nutricional..."):
         df_final = calcular_info_nutricional()
         st.session_state["df_final"] = df_final
+        publicacion = leer_publicacion() or {}
+        st.session_state["version_publicada"] = publicacion.get("version")
+        st.session_state["run_id"] = publicacion.get("run_id")
+        usar_distribucion_publicada(publicacion, df_final)
     st.success("✅ Cálculo completado correctamente.")
 
+# Resultado publicado por otra sesión o por el modo vigilancia (vigilar_datos.py)
+publicacion = leer_publicacion()
+if publicacion and st.session_state.get("version_publicada") != publicacion["version"]:
+    try:
+        if publicacion.get("pickle") and Path(publicacion["pickle"]).exists():
+            df_publicado = pd.read_pickle(publicacion["pickle"])
+        else:
+            df_publicado = consultar_ingredientes(int(publicacion["run_id"]))
+    except sqlite3.OperationalError as e:
+        # Historial ocupado: se reintenta en el próximo rerun (la versión no se marca como cargada)
+        st.warning(f"⚠️ No se pudo leer el resultado publicado: {e}")
+    else:
+        if "df_final" in st.session_state:
+            st.toast(f"🔔 Resultados actualizados ({publicacion['fecha']})")
+        st.session_state["df_final"] = df_publicado
+        st.session_state["version_publicada"] = publicacion["version"]
+        st.session_state["run_id"] = publicacion.get("run_id")
+        usar_distribucion_publicada(publicacion, df_publicado)
+
 if "df_final" not in st.session_state:
+    # Última ejecución del historial SQLite; si no existe (o está ocupado), el Excel de resultados
     try:
-        df_final = pd.read_excel(REPORTS_DIR / "recetas_calculo_nutricional.xlsx")
-        st.session_state["df_final"] = df_final
-    except FileNotFoundError:
-        st.warning("⚠️ Aún no se ha generado el archivo de cálculos.")
-        st.stop()
+        ejecuciones = listar_ejecuciones()
+        if not ejecuciones.empty:
+            st.session_state["run_id"] = int(ejecuciones["run_id"].iloc[0])
+            st.session_state["df_final"] = consultar_ingredientes(st.session_state["run_id"])
+    except sqlite3.OperationalError as e:
+        st.warning(f"⚠️ No se pudo leer el historial de ejecuciones: {e}")
+    if "df_final" not in st.session_state:
+        try:
+            # Todas las hojas `resultados*` y los archivos `_parteN` (el resultado puede venir repartido)
+            df_final = leer_hoja_streaming(REPORTS_DIR / "recetas_calculo_nutricional.xlsx", "resultados")
+            st.session_state["df_final"] = df_final
+            st.session_state["run_id"] = None
+        except FileNotFoundError:
+            st.warning("⚠️ Aún no se ha generado el archivo de cálculos.")
+            st.stop()
+        except ValueError as e:
+            st.warning(f"⚠️ {e}")
+            st.stop()
 
 df_final = st.session_state["df_final"]
 
@@ -229,18 +293,38 @@ nutr_default = [p for p in ["Energía (kcal)", "Proteína (g)", "Hierro (mg)", "
 # ============================================================
 st.markdown("---")
 
+# Con el resultado registrado en el historial, opciones, resumen y detalle se resuelven en SQL
+# (índices por run_id + columna); sin historial (Excel) o con la base ocupada, en pandas
+run_id = st.session_state.get("run_id")
+
+def consultar_historial(consulta, *args, **filtros):
+    if run_id is None:
+        return None
+    try:
+        return consulta(int(run_id), *args, **filtros)
+    except sqlite3.OperationalError as e:
+        st.warning(f"⚠️ No se pudo consultar el historial (se filtra en memoria): {e}")
+        return None
+
+def opciones_filtro(col):
+    opciones = consultar_historial(valores_distintos, col)
+    return opciones if opciones is not None else sorted(df_final[col].dropna().unique())
+
+def filtrar_en_memoria(df, filtros):
+    for col, valores in filtros.items():
+        if valores:
+            df = df[df[col].isin(valores)]
+    return df
+
 col_f1, col_f2, col_f3 = st.columns(3)
 with col_f1:
-    ut_filt = st.multiselect("UT", sorted(df_final["ut"].dropna().unique()))
+    ut_filt = st.multiselect("UT", opciones_filtro("ut"))
 with col_f2:
-    tipo_filt = st.multiselect("Tipo de receta", sorted(df_final["tipo_receta"].dropna().unique()))
+    tipo_filt = st.multiselect("Tipo de receta", opciones_filtro("tipo_receta"))
 with col_f3:
-    grupo_filt = st.multiselect("Grupo etáreo", sorted(df_final["grupo_etareo_recet"].dropna().unique()))
+    grupo_filt = st.multiselect("Grupo etáreo", opciones_filtro("grupo_etareo_recet"))
 
-df_filt = df_final.copy()
-if ut_filt: df_filt = df_filt[df_filt["ut"].isin(ut_filt)]
-if tipo_filt: df_filt = df_filt[df_filt["tipo_receta"].isin(tipo_filt)]
-if grupo_filt: df_filt = df_filt[df_filt["grupo_etareo_recet"].isin(grupo_filt)]
+filtros_sql = {"ut": ut_filt, "tipo_receta": tipo_filt, "grupo_etareo_recet": grupo_filt}
 
 # ============================================================
 # 🍱 TABLA PRINCIPAL (resumen de recetas)
@@ -253,8 +337,13 @@ nutr_sel_internal = to_internal(nutr_sel)
 
 raciones_resumen = st.number_input("Selecciona número de raciones", min_value=1, value=1, step=1, key="raciones_resumen")
 
+# Totales por receta filtrados (tabla `recetas` del historial o suma de los ingredientes en memoria)
+df_recetas_filt = consultar_historial(consultar_recetas, ["nombre_de_receta"] + nutr_sel_internal, **filtros_sql)
+if df_recetas_filt is None:
+    df_recetas_filt = filtrar_en_memoria(df_final, filtros_sql)
+
 if nutr_sel_internal:
-    df_resumen = df_filt.groupby("nombre_de_receta", as_index=False)[nutr_sel_internal].sum()
+    df_resumen = df_recetas_filt.groupby("nombre_de_receta", as_index=False)[nutr_sel_internal].sum()
     df_resumen[nutr_sel_internal] = df_resumen[nutr_sel_internal].apply(pd.to_numeric, errors="coerce").fillna(0) * raciones_resumen
     df_resumen = df_resumen.round(1)
     st.dataframe(rename_for_display(df_resumen), use_container_width=True)
@@ -268,10 +357,13 @@ st.markdown("---")
 st.subheader("Detalle por receta")
 
 col_r1, col_r2 = st.columns([3, 1])
-receta_sel = col_r1.selectbox("Seleccionar receta", df_filt["nombre_de_receta"].unique())
+receta_sel = col_r1.selectbox("Seleccionar receta", df_recetas_filt["nombre_de_receta"].unique())
 raciones_detalle = col_r2.number_input("Selecciona número de raciones", min_value=1, value=1, step=1, key="raciones_detalle")
 
-df_detalle = df_filt[df_filt["nombre_de_receta"] == receta_sel].copy()
+filtros_detalle = {**filtros_sql, "nombre_de_receta": [receta_sel]}
+df_detalle = consultar_historial(consultar_ingredientes, None, **filtros_detalle)
+if df_detalle is None:
+    df_detalle = filtrar_en_memoria(df_final, filtros_detalle).copy()
 cols_a_escalar = set(nutr_sel_internal + ["peso_neto__racion_g"])
 df_detalle[list(cols_a_escalar)] = df_detalle[list(cols_a_escalar)].apply(pd.to_numeric, errors="coerce").fillna(0) * raciones_detalle
 df_detalle[list(cols_a_escalar)] = df_detalle[list(cols_a_escalar)].round(1)
@@ -280,6 +372,295 @@ total_row = {col: ("TOTAL" if col == "ingrediente_registrado" else (df_detalle[c
 df_detalle_total = pd.concat([df_detalle, pd.DataFrame([total_row])], ignore_index=True)
 st.dataframe(rename_for_display(df_detalle_total[["ingrediente_registrado", "peso_neto__racion_g"] + nutr_sel_internal]), use_container_width=True)
 
+# ============================================================
+# 🏆 RANKING DE RECETAS POR NUTRIENTE
+# ============================================================
+st.markdown("---")
+st.subheader("Ranking de recetas")
+
+# Totales y densidades se precalculan una sola vez por resultado calculado
+if st.session_state.get("ranking_base") is not df_final:
+    st.session_state["ranking"] = RankingNutrientes(df_final)
+    st.session_state["ranking_base"] = df_final
+ranking = st.session_state["ranking"]
+
+col_k1, col_k2, col_k3, col_k4 = st.columns([2, 2, 1, 1])
+nutr_rank = col_k1.selectbox("Nutriente", [n for n in nutr_disp if PRETTY_TO_INTERNAL.get(n, n) in ranking.nutri_cols])
+base_rank = col_k2.radio("Base", list(BASES), format_func=BASES.get, horizontal=True)
+k_rank = col_k3.number_input("Top", min_value=1, value=20, step=5)
+orden_rank = col_k4.radio("Orden", ["Mayor", "Menor"], horizontal=True)
+
+if nutr_rank:
+    nutr_rank_internal = PRETTY_TO_INTERNAL.get(nutr_rank, nutr_rank)
+    df_rank = ranking.top_k(
+        nutr_rank_internal, k=int(k_rank), base=base_rank, ascendente=(orden_rank == "Menor"),
+        ut=ut_filt, tipo_receta=tipo_filt, grupo_etareo_recet=grupo_filt,
+    )
+    df_rank = df_rank.rename(columns={
+        nutr_rank_internal: f"{nutr_rank} {BASES[base_rank]}",
+        f"{nutr_rank_internal}_racion": f"{nutr_rank} por ración",
+    })
+    st.dataframe(rename_for_display(df_rank.round(2)), use_container_width=True)
+
+# ============================================================
+# 📈 DISTRIBUCIÓN DE NUTRIENTES (cuantiles e histogramas por grupo)
+# ============================================================
+st.markdown("---")
+st.subheader("Distribución de nutrientes")
+
+# Cuantiles e histogramas por UT / tipo / grupo etáreo: una sola vez por resultado calculado
+if st.session_state.get("distribucion_base") is not df_final:
+    st.session_state["distribucion"] = DistribucionNutrientes(df_final)
+    st.session_state["distribucion_base"] = df_final
+distribucion = st.session_state["distribucion"]
+
+col_d1, col_d2 = st.columns([3, 1])
+nutr_dist = col_d1.selectbox(
+    "Nutriente", [n for n in nutr_disp if PRETTY_TO_INTERNAL.get(n, n) in distribucion.nutri_cols], key="nutr_dist"
+)
+meta_dist = col_d2.number_input("Meta por ración", min_value=0.0, value=0.0, step=1.0, key="meta_dist")
+
+if nutr_dist:
+    nutr_dist_internal = PRETTY_TO_INTERNAL.get(nutr_dist, nutr_dist)
+    filtros_dist = {"ut": ut_filt, "tipo_receta": tipo_filt, "grupo_etareo_recet": grupo_filt}
+
+    pct_bajo = distribucion.pct_bajo_meta(nutr_dist_internal, meta_dist, **filtros_dist)
+    st.metric("Recetas por debajo de la meta", f"{pct_bajo:.1f} %" if pd.notna(pct_bajo) else "–")
+
+    df_hist = distribucion.histograma(nutr_dist_internal, **filtros_dist)
+    df_hist["rango"] = [f"{a:,.1f} – {b:,.1f}" for a, b in zip(df_hist["desde"], df_hist["hasta"])]
+    st.bar_chart(df_hist.set_index("rango")["recetas"])
+
+    df_dist = distribucion.resumen(nutr_dist_internal, meta=meta_dist, **filtros_dist)
+    df_dist = df_dist.rename(columns={
+        "n_recetas": "N° recetas", "media": "Media", "p10": "P10", "mediana": "Mediana", "p90": "P90",
+        "pct_bajo_meta": "% bajo la meta",
+    })
+    st.dataframe(rename_for_display(df_dist.round(2)), use_container_width=True)
+
+# ============================================================
+# 🔁 SIMULADOR DE SUSTITUCIÓN DE INGREDIENTES
+# ============================================================
+st.markdown("---")
+st.subheader("Simulador de sustitución")
+
+df_tpca, tpca_nutri = cargar_tpca_cache()
+# El índice del simulador se construye una sola vez por resultado calculado
+if st.session_state.get("simulador_base") is not df_final:
+    # Con tabla de factores, el simulador también recalcula los nutrientes retenidos y el peso cocido
+    try:
+        st.session_state["simulador"] = SimuladorSustitucion(df_final, df_tpca, tpca_nutri, cargar_factores(tpca_nutri))
+    except ValueError as e:
+        # Resultado sin método de cocción: se simulan solo los nutrientes crudos
+        st.warning(f"{e} Se simulan solo los valores crudos; recalcula el resultado para incluirlos.")
+        st.session_state["simulador"] = SimuladorSustitucion(df_final, df_tpca, tpca_nutri)
+    st.session_state["simulador_base"] = df_final
+simulador = st.session_state["simulador"]
+
+nombres_tpca = dict(zip(zip(df_tpca["codigo"], df_tpca["grupo"]), df_tpca["nombre_del_alimento"]))
+def etiqueta(k):
+    return f"{k[0]} | {k[1]} | {nombres_tpca.get(k, '')}"
+
+col_s1, col_s2, col_s3 = st.columns([2, 2, 1])
+origen = col_s1.selectbox("Alimento a reemplazar", simulador.alimentos_usados(), format_func=etiqueta)
+destino = col_s2.selectbox("Reemplazar por", list(nombres_tpca), format_func=etiqueta)
+factor = col_s3.number_input("Factor de peso", min_value=0.0, value=1.0, step=0.05)
+
+sustituciones = [{
+    "codigo_origen": origen[0], "grupo_origen": origen[1],
+    "codigo_destino": destino[0], "grupo_destino": destino[1], "factor": factor,
+}] if origen and destino else []
+
+with st.expander("Evaluar un lote de sustituciones"):
+    st.caption(f"Archivo CSV o Excel con columnas: {', '.join(COLUMNAS_SUSTITUCION)}")
+    lote_file = st.file_uploader("Cargar sustituciones candidatas", type=["csv", "xlsx"], key="lote_sustituciones")
+    if lote_file:
+        lote = pd.read_csv(lote_file) if lote_file.name.endswith(".csv") else pd.read_excel(lote_file)
+        lote.columns = lote.columns.str.lower().str.strip()
+        sustituciones = lote.to_dict("records")
+
+try:
+    df_sust = simulador.simular(sustituciones) if sustituciones else pd.DataFrame()
+except ValueError as e:
+    st.error(f"❌ {e}")
+    df_sust = pd.DataFrame()
+
+if not df_sust.empty:
+    if ut_filt: df_sust = df_sust[df_sust["ut"].isin(ut_filt)]
+    if tipo_filt: df_sust = df_sust[df_sust["tipo_receta"].isin(tipo_filt)]
+    if grupo_filt: df_sust = df_sust[df_sust["grupo_etareo_recet"].isin(grupo_filt)]
+
+    nutr_sim = [c for c in nutr_sel_internal if c in simulador.columnas]
+    cols_sim, nombres_sim = [], {}
+    for c in nutr_sim:
+        for sufijo, texto in [("_actual", "actual"), ("_nuevo", "nuevo"), ("", "Δ")]:
+            cols_sim.append(c + sufijo)
+            nombres_sim[c + sufijo] = f"{PRETTY_MAP.get(c, c)} {texto}"
+    claves_sim = ["candidato", "codigo_origen", "codigo_destino", "factor"] + simulador.claves_receta + ["ingredientes_afectados"]
+    st.caption(f"Recetas afectadas: {len(df_sust)}")
+    st.dataframe(
+        rename_for_display(df_sust[claves_sim + cols_sim].round(1).rename(columns=nombres_sim)),
+        use_container_width=True,
+    )
+else:
+    st.info("Ninguna receta (con los filtros actuales) usa el alimento seleccionado.")
+
+# ============================================================
+# 🛒 PLANIFICACIÓN DE COMPRAS (plan de raciones → gramos por UT)
+# ============================================================
+st.markdown("---")
+st.subheader("Planificación de compras")
+
+# Índice receta → ingredientes: una sola vez por resultado calculado
+if st.session_state.get("planificador_base") is not df_final:
+    st.session_state["planificador"] = PlanificadorCompras(df_final)
+    st.session_state["planificador_base"] = df_final
+planificador = st.session_state["planificador"]
+
+plantilla = planificador.plantilla()
+if ut_filt: plantilla = plantilla[plantilla["ut"].isin(ut_filt)]
+if tipo_filt: plantilla = plantilla[plantilla["tipo_receta"].isin(tipo_filt)]
+if grupo_filt: plantilla = plantilla[plantilla["grupo_etareo_recet"].isin(grupo_filt)]
+st.caption("Archivo CSV o Excel con columnas: " + ", ".join(planificador.claves_receta + ["raciones"]))
+st.download_button(
+    label="📄 Descargar plantilla del plan",
+    data=plantilla.to_csv(index=False).encode("utf-8-sig"),
+    file_name="plan_raciones.csv",
+    mime="text/csv",
+)
+
+plan_file = st.file_uploader("Cargar plan de raciones", type=["csv", "xlsx"], key="plan_raciones")
+if plan_file:
+    plan = pd.read_csv(plan_file) if plan_file.name.endswith(".csv") else pd.read_excel(plan_file)
+    try:
+        compras, plan_sin_receta = planificador.calcular(plan)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+    else:
+        if not plan_sin_receta.empty:
+            st.warning(f"⚠️ {len(plan_sin_receta)} filas del plan no corresponden a ninguna receta del resultado.")
+        compras_vista = compras[compras["ut"].isin(ut_filt)] if ut_filt else compras
+        st.caption(f"UT: {compras_vista['ut'].nunique()} | Alimentos: {len(compras_vista)} | Total: {compras_vista['cantidad_kg'].sum():,.1f} kg")
+        st.dataframe(rename_for_display(compras_vista.round(2)), use_container_width=True)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ruta_compras = exportar_compras(compras, Path(tmp) / "compras_por_ut.xlsx", plan_sin_receta)[0]
+            st.download_button(
+                label="🛒 Descargar compras por UT",
+                data=ruta_compras.read_bytes(),
+                file_name="compras_por_ut.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            )
+else:
+    st.info("Carga un plan de raciones (UT × receta × raciones) para calcular las compras.")
+
+# ============================================================
+# 🧮 OPTIMIZADOR DE MENÚS (metas por grupo etáreo)
+# ============================================================
+st.markdown("---")
+st.subheader("Optimizador de menús")
+
+# Totales por receta: una sola vez por resultado calculado
+if st.session_state.get("totales_base") is not df_final:
+    st.session_state["totales"] = totales_por_receta(df_final)
+    st.session_state["totales_base"] = df_final
+totales_recetas = st.session_state["totales"]
+
+col_o1, col_o2, col_o3 = st.columns(3)
+grupo_menu = col_o1.selectbox("Grupo etáreo del menú", sorted(totales_recetas["grupo_etareo_recet"].dropna().unique()))
+dias_menu = col_o2.number_input("Días", min_value=1, max_value=31, value=5, step=1)
+rep_menu = col_o3.number_input("Repeticiones máximas por receta", min_value=1, value=1, step=1)
+
+candidatas_menu = totales_recetas[totales_recetas["grupo_etareo_recet"] == grupo_menu]
+if ut_filt: candidatas_menu = candidatas_menu[candidatas_menu["ut"].isin(ut_filt)]
+tipos_menu = sorted(candidatas_menu["tipo_receta"].dropna().unique())
+tiempos_sel = st.multiselect("Tiempos de comida", tipos_menu, default=tipos_menu)
+with st.expander("Tipos de receta permitidos por tiempo"):
+    tiempos_menu = {t: st.multiselect(t, tipos_menu, default=[t], key=f"tiempo_{t}") for t in tiempos_sel}
+
+# Metas: archivo de metas por grupo etáreo o, si no existe, referencia = suma de medianas por tiempo
+metas_archivo = metas_de_grupo(cargar_metas(), grupo_menu)
+nutr_meta = [n for n in NUTRIENTES_META if n in candidatas_menu.columns]
+cols_meta = st.columns(max(1, len(nutr_meta)))
+metas_menu = {}
+for col, n in zip(cols_meta, nutr_meta):
+    referencia = metas_archivo.get(n)
+    if referencia is None:
+        referencia = sum(candidatas_menu.loc[candidatas_menu["tipo_receta"].isin(p), n].median() for p in tiempos_menu.values() if p)
+    metas_menu[n] = col.number_input(f"Mín. {PRETTY_MAP.get(n, n)}", min_value=0.0, value=float(round(referencia or 0, 1)), key=f"meta_{n}")
+
+objetivo_menu = st.radio("Minimizar", ["Peso por ración", "Costo"], horizontal=True)
+costos_menu = None
+if objetivo_menu == "Costo":
+    costos_file = st.file_uploader("Costos por receta (CSV o Excel con nombre_de_receta y costo)", type=["csv", "xlsx"], key="costos_menu")
+    if costos_file:
+        tabla_costos = pd.read_csv(costos_file) if costos_file.name.endswith(".csv") else pd.read_excel(costos_file)
+        try:
+            costos_menu = costos_desde_tabla(candidatas_menu, tabla_costos)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+
+if st.button("🧮 Optimizar menú"):
+    if objetivo_menu == "Costo" and costos_menu is None:
+        st.warning("⚠️ Carga la tabla de costos para minimizar el costo.")
+    else:
+        with st.spinner("Buscando el menú..."):
+            try:
+                st.session_state["menu_optimo"] = optimizar_menu(
+                    candidatas_menu, {n: v for n, v in metas_menu.items() if v > 0}, dias=int(dias_menu),
+                    tiempos={t: p for t, p in tiempos_menu.items() if p}, max_repeticiones=int(rep_menu), costos=costos_menu,
+                )
+            except ValueError as e:
+                st.session_state.pop("menu_optimo", None)
+                st.error(f"❌ {e}")
+
+if "menu_optimo" in st.session_state:
+    menu_opt, resumen_opt, estado_opt = st.session_state["menu_optimo"]
+    if estado_opt["optimo"]:
+        st.success(f"✅ Menú óptimo encontrado (objetivo: {estado_opt['objetivo']:,.1f}).")
+    elif not np.isfinite(estado_opt["cota"]):
+        st.info("ℹ️ Mejor menú encontrado en el tiempo límite (sin cota inferior: no se pudo medir la brecha al óptimo).")
+    else:
+        st.info(f"ℹ️ Mejor menú encontrado en el tiempo límite (brecha al óptimo ≤ {estado_opt['brecha']:.1%}).")
+    cols_menu = ["dia", "tiempo"] + [c for c in ["ut", "tipo_receta", "nombre_de_receta"] if c in menu_opt.columns] + ["costo"] + [n for n in nutr_meta if n in menu_opt.columns]
+    st.dataframe(rename_for_display(menu_opt[cols_menu].round(1)), use_container_width=True)
+    st.dataframe(rename_for_display(resumen_opt.round(1)), use_container_width=True)
+
+# ============================================================
+# 🗄️ HISTORIAL DE EJECUCIONES (consultas SQL sobre el almacén)
+# ============================================================
+st.markdown("---")
+st.subheader("Historial de ejecuciones")
+
+try:
+    historial = listar_ejecuciones()
+except sqlite3.OperationalError as e:
+    st.warning(f"⚠️ No se pudo leer el historial de ejecuciones: {e}")
+    historial = pd.DataFrame()
+if historial.empty:
+    st.info("Aún no hay ejecuciones registradas en el historial.")
+else:
+    etiquetas_run = {int(r.run_id): f"#{r.run_id} – {r.fecha} ({r.filas} filas)" for r in historial.itertuples()}
+    runs = list(etiquetas_run)
+    col_h1, col_h2 = st.columns(2)
+    run_nuevo = col_h1.selectbox("Ejecución", runs, format_func=etiquetas_run.get, key="run_nuevo")
+    run_anterior = col_h2.selectbox("Comparar con", runs, index=min(1, len(runs) - 1),
+                                    format_func=etiquetas_run.get, key="run_anterior")
+
+    # Los filtros y los nutrientes seleccionados se resuelven en SQL
+    columnas_hist = ["ut", "tipo_receta", "grupo_etareo_recet", "nombre_de_receta"] + nutr_sel_internal
+    try:
+        df_hist = consultar_recetas(run_nuevo, columnas_hist, **filtros_sql)
+        st.dataframe(rename_for_display(df_hist.round(1)), use_container_width=True)
+
+        if run_anterior != run_nuevo:
+            df_diff = diferencias_entre_ejecuciones(run_anterior, run_nuevo, nutr_sel_internal, **filtros_sql)
+            st.caption(f"Cambios entre #{run_anterior} y #{run_nuevo}: {df_diff['nombre_de_receta'].nunique()} recetas")
+            df_diff["nutriente"] = df_diff["nutriente"].map(lambda c: PRETTY_MAP.get(c, c))
+            st.dataframe(rename_for_display(df_diff.round(2)), use_container_width=True)
+    except Exception as e:
+        st.error(f"❌ No se pudo consultar el historial: {e}")
+
 # ============================================================
 # 📤 EXPORTAR RESULTADOS
 # ============================================================
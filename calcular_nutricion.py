@@ -7,6 +7,9 @@ from __future__ import annotations
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
+from calculo_nutricional_recetas import columnas_nutrientes, columnas_receta
+from exportar_excel import escribir_excel_streaming
+from factores_retencion import COL_METODO, cargar_factores
 
 # Rutas relativas al repo (ajusta si tu layout difiere)
 REPO_ROOT = Path(__file__).resolve().parents[2]  # .../ucc-composicion-nutricional
@@ -51,7 +54,7 @@ def calcular_desde_upload(uploaded_excel) -> pd.DataFrame:
     - Lee recetas desde el archivo subido (Excel)
     - Lee TPCA desde data/processed/tablas_peruanas_clean.csv
     - Cruza por (codigo + grupo) y escala nutrientes por peso_neto__racion_g
-    - Guarda Excel completo en reports/recetas_calculo_nutricional.xlsx (con metadatos)
+    - Guarda Excel completo en reports/recetas_calculo_nutricional.xlsx (con sin_match y metadatos)
     - Retorna DataFrame procesado
     """
     if not TPCA_PATH.exists():
@@ -106,37 +109,39 @@ def calcular_desde_upload(uploaded_excel) -> pd.DataFrame:
         validate="m:1"
     )
 
-    # 7) Escalar nutrientes por peso (por 100g)
-    peso = pd.to_numeric(merged[col_peso], errors="coerce").fillna(0)
-    for col in nutri_cols:
-        merged[col] = pd.to_numeric(merged[col], errors="coerce") * (peso / 100.0)
+    sin_match_mask = merged[nutri_cols].isna().all(axis=1)
+    df_sin_match = merged.loc[sin_match_mask, [col_cod_rec, col_grp_rec]].drop_duplicates()
 
-    # 8) Seleccionar columnas: recetas 0..18 + nutrientes 3..26
-    cols_recetas = merged.columns[:19]
-    out_cols = list(cols_recetas) + list(nutri_cols)
-    df_final = merged[out_cols].copy()
+    # 7) Escalar nutrientes por peso (por 100g): un solo producto sobre la matriz de nutrientes
+    peso = pd.to_numeric(merged[col_peso], errors="coerce").fillna(0).to_numpy(dtype=float)
+    valores = merged[nutri_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    valores *= peso[:, None] / 100.0
 
-    # 9) Guardar Excel completo (con metadatos)
+    # 7b) Retención y rendimiento por cocción (si existe data/processed/factores_retencion.csv)
+    bloques = [pd.DataFrame(valores, columns=nutri_cols)]
+    factores = cargar_factores(nutri_cols.tolist())
+    if factores is not None:
+        posiciones = factores.posiciones(merged[col_cod_rec], merged[col_grp_rec], merged.get(COL_METODO))
+        bloques.append(factores.aplicar(valores, peso, posiciones))
+
+    # 8) Seleccionar columnas: recetas (las mismas informativas que el pipeline, + método de cocción)
+    #    + nutrientes 3..26 (+ peso cocido y retenidos)
+    cols_recetas = columnas_receta(merged.columns)
+    df_final = pd.concat([merged[cols_recetas].reset_index(drop=True)] + bloques, axis=1)
+
+    # 9) Guardar Excel completo (con metadatos) en modo streaming
     meta = pd.DataFrame({
-        "campo": ["fecha_proceso", "fuente_tpca", "filas_resultado", "columnas_resultado"],
+        "campo": ["fecha_proceso", "fuente_tpca", "filas_resultado", "columnas_resultado", "ingredientes_sin_match"],
         "valor": [datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                  str(TPCA_PATH), len(df_final), len(df_final.columns)]
+                  str(TPCA_PATH), len(df_final), len(df_final.columns), len(df_sin_match)]
     })
 
-    with pd.ExcelWriter(OUTPUT_XLSX, engine="openpyxl") as writer:
-        df_final.to_excel(writer, sheet_name="resultados", index=False)
-        meta.to_excel(writer, sheet_name="metadatos", index=False)
+    escribir_excel_streaming(OUTPUT_XLSX, {"resultados": df_final, "sin_match": df_sin_match, "metadatos": meta})
 
     return df_final
 
 
-# Exponer helpers para la app
-def columnas_nutrientes(df_final: pd.DataFrame) -> list[str]:
-    """Devuelve lista de columnas de nutrientes (asumimos que son las que vienen después de la 19)."""
-    if df_final.shape[1] <= 19:
-        return []
-    return df_final.columns[19:].tolist()
-
+# Exponer helpers para la app (columnas_nutrientes se importa del pipeline: mismo corte)
 def columnas_controles(df_final: pd.DataFrame) -> dict:
     """Intenta identificar columnas para filtros estándar."""
     def _col(df, needles):
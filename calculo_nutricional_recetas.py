@@ -2,8 +2,14 @@
 # ⚗️ Cálculo nutricional a partir de recetas limpias y TPCA (join por código + grupo)
 # ============================================================
 
+import json
+import os
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from datetime import datetime
+from exportar_excel import EscritorExcelStreaming, escribir_excel_streaming
+from procesamiento_bloques import FILAS_POR_BLOQUE, detectar_separador, filtrar_duplicados
 
 # ============================================================
 # 📂 Rutas
@@ -20,7 +26,164 @@ REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 FILE_RECETAS = DATA_PROCESSED / "recetas_calculo_clean.csv"
 FILE_TPCA = DATA_PROCESSED / "tablas_peruanas_clean.csv"
 OUTPUT_FILE = REPORTS_DIR / "recetas_calculo_nutricional.xlsx"
-OUTPUT_FAIL = REPORTS_DIR / "recetas_sin_match.xlsx"
+
+# TPCA ya normalizada (se reconstruye cuando cambia el CSV limpio)
+TPCA_COMPILADA = DATA_PROCESSED / "tpca_compilada.pkl"
+# Último resultado publicado para el dashboard
+PUBLICADO_PKL = REPORTS_DIR / "recetas_calculo_nutricional.pkl"
+PUBLICADO_MANIFIESTO = REPORTS_DIR / "ultimo_resultado.json"
+# Distribuciones precalculadas (cuantiles e histogramas) del último resultado
+PUBLICADO_DISTRIBUCIONES = REPORTS_DIR / "distribuciones.pkl"
+
+# ============================================================
+# 🔑 Columnas clave
+# ============================================================
+COL_CODIGO_RECETA = "codigo_del_alimento_tpca_2017"
+COL_GRUPO_RECETA = "grupo_alimento_tpca2017"
+COL_CODIGO_TPCA = "codigo"
+COL_GRUPO_TPCA = "grupo"
+COL_PESO = "peso_neto__racion_g"
+# Columnas que identifican una receta en el resultado (las que existan)
+CLAVES_RECETA = ["ut", "tipo_receta", "grupo_etareo_recet", "nombre_de_receta"]
+# Columnas informativas del archivo de recetas que pasan al resultado; los nutrientes van después
+N_COLUMNAS_RECETA = 20
+
+# ============================================================
+# 🔠 Utilidades compartidas
+# ============================================================
+def normalize_code(x):
+    """Estandariza un código de alimento como texto limpio (Ej: 38.0 → "38")."""
+    if pd.isna(x):
+        return ""
+    x = str(x).strip().upper()
+    if x.replace(".", "", 1).isdigit():
+        x = str(int(float(x)))
+    return x
+
+
+def columnas_receta(columnas) -> list[str]:
+    """
+    Columnas informativas del resultado: las primeras N_COLUMNAS_RECETA del archivo de recetas y,
+    si viene más adelante, el método de cocción (lo usan los factores de retención y el simulador).
+    """
+    from factores_retencion import COL_METODO
+    informativas = list(columnas[:N_COLUMNAS_RECETA])
+    if COL_METODO in columnas and COL_METODO not in informativas:
+        informativas.append(COL_METODO)
+    return informativas
+
+
+def _leer_tpca_csv(path):
+    df_tpca = pd.read_csv(path, sep=None, engine="python", on_bad_lines="skip")
+    df_tpca.columns = df_tpca.columns.str.lower().str.strip()
+    for col in [COL_CODIGO_TPCA, COL_GRUPO_TPCA]:
+        if col not in df_tpca.columns:
+            raise ValueError(f"❌ No se encontró la columna '{col}' en TPCA.")
+
+    df_tpca[COL_CODIGO_TPCA] = df_tpca[COL_CODIGO_TPCA].apply(normalize_code)
+    df_tpca[COL_GRUPO_TPCA] = df_tpca[COL_GRUPO_TPCA].astype(str).str.strip().str.upper()
+    return df_tpca, df_tpca.columns[3:27].tolist()
+
+
+def compilar_tpca(path=FILE_TPCA, destino=None):
+    """Guarda la TPCA ya normalizada (pickle) para no volver a parsear el CSV en cada cálculo."""
+    destino = destino or TPCA_COMPILADA
+    df_tpca, nutri_cols = _leer_tpca_csv(path)
+    temporal = Path(destino).with_suffix(".tmp")
+    pd.to_pickle({"df_tpca": df_tpca, "nutri_cols": nutri_cols, "fuente_mtime": Path(path).stat().st_mtime}, temporal)
+    os.replace(temporal, destino)
+    print(f"🧩 TPCA compilada guardada en: {destino}")
+    return df_tpca, nutri_cols
+
+
+def cargar_tpca(path=FILE_TPCA):
+    """
+    Lee la TPCA limpia con columnas en minúsculas y claves (código + grupo) normalizadas.
+    Devuelve (df_tpca, nutri_cols) con las columnas nutricionales (habitualmente 3→26).
+    Usa la TPCA compilada si está al día con el CSV.
+    """
+    if Path(path) == FILE_TPCA and TPCA_COMPILADA.exists():
+        compilada = pd.read_pickle(TPCA_COMPILADA)
+        if compilada.get("fuente_mtime") == Path(path).stat().st_mtime:
+            return compilada["df_tpca"], compilada["nutri_cols"]
+    return _leer_tpca_csv(path)
+
+
+def publicar_resultado(run_id, df_final=None, fuente=None, totales=None):
+    """
+    Publica el último resultado para el dashboard: el DataFrame en pickle (si se tiene en memoria),
+    sus distribuciones precalculadas (desde `df_final` o, en modo por bloques, desde `totales`)
+    y un manifiesto JSON con la versión. El dashboard lo carga sin recalcular.
+    """
+    from analitica_distribucion import DistribucionNutrientes
+
+    if df_final is not None:
+        temporal = PUBLICADO_PKL.with_suffix(".tmp")
+        df_final.to_pickle(temporal)
+        os.replace(temporal, PUBLICADO_PKL)
+    elif PUBLICADO_PKL.exists():
+        PUBLICADO_PKL.unlink()
+
+    if df_final is not None:
+        distribucion = DistribucionNutrientes(df_final)
+    elif totales is not None:
+        distribucion = DistribucionNutrientes.desde_totales(totales)
+    else:
+        distribucion = None
+    if distribucion is not None:
+        temporal = PUBLICADO_DISTRIBUCIONES.with_suffix(".tmp")
+        pd.to_pickle(distribucion, temporal)
+        os.replace(temporal, PUBLICADO_DISTRIBUCIONES)
+    elif PUBLICADO_DISTRIBUCIONES.exists():
+        PUBLICADO_DISTRIBUCIONES.unlink()
+
+    manifiesto = {
+        "version": f"{run_id}-{datetime.now():%Y%m%d%H%M%S%f}",
+        "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "run_id": run_id,
+        "fuente": str(fuente) if fuente else None,
+        "pickle": str(PUBLICADO_PKL) if df_final is not None else None,
+        "distribuciones": str(PUBLICADO_DISTRIBUCIONES) if distribucion is not None else None,
+    }
+    temporal = PUBLICADO_MANIFIESTO.with_suffix(".tmp")
+    temporal.write_text(json.dumps(manifiesto, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(temporal, PUBLICADO_MANIFIESTO)
+    return manifiesto
+
+
+def leer_publicacion():
+    """Manifiesto del último resultado publicado (None si aún no hay)."""
+    if not PUBLICADO_MANIFIESTO.exists():
+        return None
+    return json.loads(PUBLICADO_MANIFIESTO.read_text(encoding="utf-8"))
+
+
+def columnas_nutrientes(df_final):
+    """
+    Columnas de nutrientes del resultado: las que vienen después de las informativas
+    (columnas_receta), en todos los modos de cálculo (completo, por bloques y desde la app).
+    """
+    from factores_retencion import COL_METODO
+    return [c for c in df_final.columns[N_COLUMNAS_RECETA:] if c != COL_METODO]
+
+
+def totales_por_receta(df_final, nutri_cols=None):
+    """
+    Suma por receta (CLAVES_RECETA) de los nutrientes y del peso neto por ración.
+    Devuelve un DataFrame con las claves de receta, `peso_neto__racion_g` y los nutrientes.
+    """
+    if nutri_cols is None:
+        nutri_cols = columnas_nutrientes(df_final)
+    claves = [c for c in CLAVES_RECETA if c in df_final.columns]
+    if not claves:
+        raise ValueError("No se detectaron columnas de identificación de receta.")
+    valores = [COL_PESO] + [c for c in nutri_cols if c != COL_PESO]
+    numericos = df_final[valores].apply(pd.to_numeric, errors="coerce")
+    return (
+        pd.concat([df_final[claves], numericos], axis=1)
+        .groupby(claves, as_index=False, sort=False, dropna=False)[valores]
+        .sum()
+    )
 
 # ============================================================
 # 🧮 Función principal
@@ -33,60 +196,48 @@ def calcular_info_nutricional():
     """
     print("📘 Cargando archivos...")
     df_recetas = pd.read_csv(FILE_RECETAS, sep=None, engine="python")
-    df_tpca = pd.read_csv(FILE_TPCA, sep=None, engine="python", on_bad_lines="skip")
+    df_tpca, nutri_cols = cargar_tpca(FILE_TPCA)
 
     # ============================================================
     # 🧼 Normalizar nombres de columnas
     # ============================================================
     df_recetas.columns = df_recetas.columns.str.lower().str.strip()
-    df_tpca.columns = df_tpca.columns.str.lower().str.strip()
 
     # ============================================================
     # 🔍 Definir columnas clave
     # ============================================================
-    col_codigo_receta = "codigo_del_alimento_tpca_2017"
-    col_grupo_receta = "grupo_alimento_tpca2017"
-    col_codigo_tpca = "codigo"
-    col_grupo_tpca = "grupo"
-    col_peso = "peso_neto__racion_g"
+    col_codigo_receta = COL_CODIGO_RECETA
+    col_grupo_receta = COL_GRUPO_RECETA
+    col_codigo_tpca = COL_CODIGO_TPCA
+    col_grupo_tpca = COL_GRUPO_TPCA
+    col_peso = COL_PESO
 
     # Validar existencia de columnas clave
     for col in [col_codigo_receta, col_grupo_receta, col_peso]:
         if col not in df_recetas.columns:
             raise ValueError(f"❌ No se encontró la columna '{col}' en recetas.")
-    for col in [col_codigo_tpca, col_grupo_tpca]:
-        if col not in df_tpca.columns:
-            raise ValueError(f"❌ No se encontró la columna '{col}' en TPCA.")
 
     # ============================================================
-    # 🧩 Seleccionar columnas nutricionales (habitualmente 3→26)
+    # 🧩 Columnas nutricionales (habitualmente 3→26)
     # ============================================================
-    nutri_cols = df_tpca.columns[3:27]
     print(f"📊 Columnas nutricionales detectadas: {len(nutri_cols)}")
 
     # ============================================================
     # 🔠 Estandarizar claves (convertir a texto limpio)
     # ============================================================
-    def normalize_code(x):
-        if pd.isna(x):
-            return ""
-        x = str(x).strip().upper()
-        if x.replace(".", "", 1).isdigit():
-            x = str(int(float(x)))  # Ej: 38.0 → "38"
-        return x
-
     df_recetas[col_codigo_receta] = df_recetas[col_codigo_receta].apply(normalize_code)
     df_recetas[col_grupo_receta] = df_recetas[col_grupo_receta].astype(str).str.strip().str.upper()
 
-    df_tpca[col_codigo_tpca] = df_tpca[col_codigo_tpca].apply(normalize_code)
-    df_tpca[col_grupo_tpca] = df_tpca[col_grupo_tpca].astype(str).str.strip().str.upper()
-
     # ============================================================
     # 🔗 Unir tablas por código + grupo
     # ============================================================
+    # Nutrientes numéricos desde la TPCA (pocas filas) para escalar el cruce como una sola matriz
+    tpca_numerica = df_tpca[[col_codigo_tpca, col_grupo_tpca]].join(
+        df_tpca[nutri_cols].apply(pd.to_numeric, errors="coerce")
+    )
     merged = pd.merge(
         df_recetas,
-        df_tpca[[col_codigo_tpca, col_grupo_tpca] + nutri_cols.tolist()],
+        tpca_numerica,
         left_on=[col_codigo_receta, col_grupo_receta],
         right_on=[col_codigo_tpca, col_grupo_tpca],
         how="left",
@@ -100,30 +251,56 @@ def calcular_info_nutricional():
     print(f"📍 Coincidencias encontradas: {n_total - n_sin} / {n_total}")
 
     # ============================================================
-    # ⚖️ Calcular nutrientes ajustados por peso (por 100 g)
+    # ⚖️ Calcular nutrientes ajustados por peso (por 100 g): un solo producto sobre la matriz
     # ============================================================
-    peso = pd.to_numeric(merged[col_peso], errors="coerce").fillna(0)
-    for col in nutri_cols:
-        merged[col] = pd.to_numeric(merged[col], errors="coerce") * (peso / 100)
+    peso = pd.to_numeric(merged[col_peso], errors="coerce").fillna(0).to_numpy(dtype=float)
+    valores = merged[nutri_cols].to_numpy(dtype=float)
+    valores *= peso[:, None] / 100
+
+    # 🍳 Retención y rendimiento por cocción (si existe la tabla de factores)
+    from factores_retencion import COL_METODO, FILE_FACTORES, cargar_factores
+    factores = cargar_factores(nutri_cols)
+    bloques = [pd.DataFrame(valores, columns=nutri_cols)]
+    if factores is not None:
+        posiciones = factores.posiciones(
+            merged[col_codigo_receta], merged[col_grupo_receta], merged.get(COL_METODO)
+        )
+        bloques.append(factores.aplicar(valores, peso, posiciones))
 
     # ============================================================
-    # 🧱 Seleccionar columnas finales
+    # 🧱 Seleccionar columnas finales (crudos y retenidos lado a lado)
     # ============================================================
-    columnas_receta = merged.columns[:20]  # primeras columnas informativas
-    columnas_finales = list(columnas_receta) + list(nutri_cols)
-    df_final = merged[columnas_finales]
+    informativas = columnas_receta(merged.columns)  # primeras columnas informativas (+ método de cocción)
+    df_final = pd.concat([merged[informativas].reset_index(drop=True)] + bloques, axis=1)
 
     # ============================================================
-    # 💾 Guardar resultados
+    # 💾 Guardar resultados (streaming: resultados + sin_match + metadatos)
     # ============================================================
-    df_final.to_excel(OUTPUT_FILE, index=False)
-    print(f"✅ Archivo con resultados guardado en: {OUTPUT_FILE}")
+    df_sin_match = merged.loc[sin_match_mask, [col_codigo_receta, col_grupo_receta]].drop_duplicates()
+    meta = pd.DataFrame({
+        "campo": ["fecha_proceso", "fuente_recetas", "fuente_tpca", "factores_retencion", "filas_resultado",
+                  "columnas_resultado", "ingredientes_sin_match"],
+        "valor": [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), str(FILE_RECETAS), str(FILE_TPCA),
+                  str(FILE_FACTORES) if factores is not None else "",
+                  len(df_final), len(df_final.columns), len(df_sin_match)]
+    })
 
+    rutas = escribir_excel_streaming(OUTPUT_FILE, {
+        "resultados": df_final,
+        "sin_match": df_sin_match,
+        "metadatos": meta,
+    })
+    for ruta in rutas:
+        print(f"✅ Archivo con resultados guardado en: {ruta}")
     if n_sin > 0:
-        merged.loc[sin_match_mask, [col_codigo_receta, col_grupo_receta]].drop_duplicates().to_excel(
-            OUTPUT_FAIL, index=False
-        )
-        print(f"⚠️ Ingredientes sin coincidencia guardados en: {OUTPUT_FAIL}")
+        print(f"⚠️ Ingredientes sin coincidencia: {len(df_sin_match)} (hoja 'sin_match')")
+
+    # Historial: cada ejecución se agrega al almacén SQLite
+    # (import local: almacen_resultados reutiliza utilidades de este módulo)
+    import almacen_resultados
+    run_id = almacen_resultados.registrar_ejecucion(df_final, dict(zip(meta["campo"], meta["valor"])))
+    print(f"🗄️ Ejecución #{run_id} registrada en: {almacen_resultados.DB_PATH}")
+    publicar_resultado(run_id, df_final, FILE_RECETAS)
 
     # ============================================================
     # 👀 Vista previa
@@ -137,8 +314,135 @@ def calcular_info_nutricional():
     return df_final
 
 
+# ============================================================
+# 🧱 Modo por bloques (archivos de recetas más grandes que la memoria)
+# ============================================================
+def calcular_info_nutricional_por_bloques(chunksize=FILAS_POR_BLOQUE):
+    """
+    Variante de calcular_info_nutricional con memoria acotada:
+    - Lee el CSV de recetas limpias en bloques de `chunksize` filas
+    - Deduplica con un conjunto de huellas de filas (sin retener las filas)
+    - Cruza cada bloque con el índice en memoria de la TPCA (código + grupo) y escala por peso
+    - Escribe cada bloque al Excel (streaming) y al historial SQLite a medida que avanza
+    - Acumula los totales por receta de forma incremental
+
+    Devuelve el DataFrame de totales por receta (el detalle por ingrediente queda en disco).
+    """
+    import almacen_resultados
+    from factores_retencion import COL_METODO, FILE_FACTORES, cargar_factores
+
+    print(f"📘 Leyendo recetas por bloques de {chunksize:,} filas...")
+    df_tpca, nutri_cols = cargar_tpca(FILE_TPCA)
+    print(f"📊 Columnas nutricionales detectadas: {len(nutri_cols)}")
+    factores = cargar_factores(nutri_cols)
+    # Nutrientes del resultado: crudos y, si hay factores, peso cocido y retenidos
+    nutri_salida = list(nutri_cols) + (factores.columnas if factores is not None else [])
+
+    # Índice TPCA: (código, grupo) → fila de la matriz de nutrientes por 100 g
+    df_tpca = df_tpca.drop_duplicates([COL_CODIGO_TPCA, COL_GRUPO_TPCA])
+    tpca_index = pd.MultiIndex.from_frame(df_tpca[[COL_CODIGO_TPCA, COL_GRUPO_TPCA]])
+    tpca_matriz = df_tpca[nutri_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    tpca_claves = df_tpca[[COL_CODIGO_TPCA, COL_GRUPO_TPCA]].to_numpy(dtype=object)
+
+    vistas: set = set()
+    sin_match: set = set()
+    totales = None
+    n_total = n_sin = n_duplicadas = 0
+    columnas_finales = informativas = None
+    meta = {
+        "fecha_proceso": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "fuente_recetas": str(FILE_RECETAS),
+        "fuente_tpca": str(FILE_TPCA),
+        "factores_retencion": str(FILE_FACTORES) if factores is not None else "",
+    }
+
+    # dtype=str: la huella de una fila no depende del tipo que pandas infiera en cada bloque
+    # (una fila repetida en otro bloque se detecta aunque una columna pase de int a float)
+    lector = pd.read_csv(FILE_RECETAS, sep=detectar_separador(FILE_RECETAS), chunksize=chunksize, dtype=str)
+    with EscritorExcelStreaming(OUTPUT_FILE) as escritor, almacen_resultados.RegistroEjecucion(meta) as registro:
+        for bloque in lector:
+            bloque.columns = bloque.columns.str.lower().str.strip()
+            if columnas_finales is None:
+                for col in [COL_CODIGO_RECETA, COL_GRUPO_RECETA, COL_PESO]:
+                    if col not in bloque.columns:
+                        raise ValueError(f"❌ No se encontró la columna '{col}' en recetas.")
+
+            n_antes = len(bloque)
+            bloque = filtrar_duplicados(bloque, vistas)
+            n_duplicadas += n_antes - len(bloque)
+            if bloque.empty:
+                continue
+
+            bloque[COL_PESO] = pd.to_numeric(bloque[COL_PESO], errors="coerce")
+            bloque[COL_CODIGO_RECETA] = bloque[COL_CODIGO_RECETA].apply(normalize_code)
+            bloque[COL_GRUPO_RECETA] = bloque[COL_GRUPO_RECETA].astype(str).str.strip().str.upper()
+
+            # Cruce contra el índice TPCA (equivalente al merge m:1 del modo completo)
+            pos = tpca_index.get_indexer(pd.MultiIndex.from_frame(bloque[[COL_CODIGO_RECETA, COL_GRUPO_RECETA]]))
+            match = pos >= 0
+            for i, col in enumerate([COL_CODIGO_TPCA, COL_GRUPO_TPCA]):
+                if col not in bloque.columns:
+                    bloque[col] = np.where(match, tpca_claves[pos, i], None)
+
+            peso = bloque[COL_PESO].fillna(0).to_numpy(dtype=float)
+            valores = np.where(match[:, None], tpca_matriz[pos], np.nan) * (peso[:, None] / 100)
+            sin_match_mask = np.isnan(valores).all(axis=1)
+            sin_match.update(map(tuple, bloque.loc[sin_match_mask, [COL_CODIGO_RECETA, COL_GRUPO_RECETA]].to_numpy()))
+
+            if columnas_finales is None:
+                informativas = columnas_receta(bloque.columns)
+                columnas_finales = informativas + nutri_salida
+                registro.columnas = columnas_finales
+            bloques = [bloque[informativas].reset_index(drop=True), pd.DataFrame(valores, columns=nutri_cols)]
+            if factores is not None:
+                posiciones = factores.posiciones(bloque[COL_CODIGO_RECETA], bloque[COL_GRUPO_RECETA], bloque.get(COL_METODO))
+                bloques.append(factores.aplicar(valores, peso, posiciones))
+            df_bloque = pd.concat(bloques, axis=1)
+
+            escritor.agregar("resultados", df_bloque)
+            registro.agregar_ingredientes(df_bloque)
+
+            parcial = totales_por_receta(df_bloque, nutri_salida).set_index(
+                [c for c in CLAVES_RECETA if c in df_bloque.columns]
+            )
+            totales = parcial if totales is None else totales.add(parcial, fill_value=0)
+
+            n_total += len(df_bloque)
+            n_sin += int(sin_match_mask.sum())
+            print(f"   … {n_total:,} filas procesadas")
+
+        if totales is None:
+            raise ValueError("El archivo de recetas está vacío.")
+        df_totales = totales.reset_index()
+        df_sin_match = pd.DataFrame(sorted(sin_match), columns=[COL_CODIGO_RECETA, COL_GRUPO_RECETA])
+        meta["ingredientes_sin_match"] = len(df_sin_match)
+
+        escritor.agregar("totales_receta", df_totales)
+        escritor.agregar("sin_match", df_sin_match)
+        escritor.agregar("metadatos", pd.DataFrame({
+            "campo": list(meta) + ["filas_resultado", "columnas_resultado", "filas_duplicadas"],
+            "valor": list(meta.values()) + [n_total, len(columnas_finales), n_duplicadas],
+        }))
+        registro.registrar_recetas(df_totales)
+
+    print(f"📍 Coincidencias encontradas: {n_total - n_sin} / {n_total} | Duplicadas omitidas: {n_duplicadas}")
+    for ruta in escritor.rutas:
+        print(f"✅ Archivo con resultados guardado en: {ruta}")
+    print(f"🗄️ Ejecución #{registro.run_id} registrada en: {almacen_resultados.DB_PATH}")
+    publicar_resultado(registro.run_id, fuente=FILE_RECETAS, totales=df_totales)
+    print(f"\n📊 Recetas: {len(df_totales)} | Filas: {n_total}")
+
+    return df_totales
+
+
 # ============================================================
 # 🚀 Ejecución directa (modo script)
 # ============================================================
 if __name__ == "__main__":
-    calcular_info_nutricional()
+    import sys
+    if "--bloques" in sys.argv:
+        i = sys.argv.index("--bloques")
+        n = int(sys.argv[i + 1]) if len(sys.argv) > i + 1 else FILAS_POR_BLOQUE
+        calcular_info_nutricional_por_bloques(n)
+    else:
+        calcular_info_nutricional()
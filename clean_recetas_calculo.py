@@ -118,6 +118,8 @@ from io import StringIO
 from xlsx2csv import Xlsx2csv
 import tempfile
 import os
+import numpy as np
+from procesamiento_bloques import FILAS_POR_BLOQUE, filtrar_duplicados
 
 # ============================================================
 # 📂 Configuración de rutas
@@ -129,6 +131,34 @@ REPORTS_DIR = BASE_DIR / "reports"
 DATA_PROCESSED.mkdir(parents=True, exist_ok=True)
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 
+# ============================================================
+# 🔤 Utilidades
+# ============================================================
+def _normalizar_columnas(columnas):
+    return (
+        pd.Index(columnas).astype(str)
+        .str.strip()
+        .str.lower()
+        .str.replace(" ", "_")
+        .str.replace("[^a-z0-9_]", "", regex=True)
+    )
+
+
+def _tipo_columna(texto):
+    """
+    Tipo que tendría la columna tras pd.to_numeric: numérico si todos los valores no vacíos
+    se pueden convertir, object si alguno no (la misma regla que el modo completo).
+    """
+    convertido = pd.to_numeric(texto, errors="coerce")
+    fallidos = convertido.isna() & texto.notna() & texto.ne("")
+    return np.dtype(object) if fallidos.any() else convertido.dtype
+
+
+def _xlsx_a_csv_temporal(file_path):
+    temp_csv = tempfile.NamedTemporaryFile(delete=False, suffix=".csv").name
+    Xlsx2csv(str(file_path), outputencoding="utf-8").convert(temp_csv)
+    return temp_csv
+
 # ============================================================
 # 🧩 Función de limpieza (compatible sin openpyxl)
 # ============================================================
@@ -147,8 +177,7 @@ def limpiar_recetas(file_path=None):
     # ============================================================
     # 🔄 Convertir XLSX → CSV temporal
     # ============================================================
-    temp_csv = tempfile.NamedTemporaryFile(delete=False, suffix=".csv").name
-    Xlsx2csv(str(file_path), outputencoding="utf-8").convert(temp_csv)
+    temp_csv = _xlsx_a_csv_temporal(file_path)
 
     # Cargar CSV convertido
     df = pd.read_csv(temp_csv)
@@ -161,13 +190,7 @@ def limpiar_recetas(file_path=None):
     # ============================================================
     # 🧼 Limpieza general
     # ============================================================
-    df.columns = (
-        df.columns.astype(str)
-        .str.strip()
-        .str.lower()
-        .str.replace(" ", "_")
-        .str.replace("[^a-z0-9_]", "", regex=True)
-    )
+    df.columns = _normalizar_columnas(df.columns)
 
     # Eliminar filas vacías y duplicados
     df = df.dropna(how="all").drop_duplicates()
@@ -176,9 +199,10 @@ def limpiar_recetas(file_path=None):
     for col in df.select_dtypes(include=["object"]):
         df[col] = df[col].astype(str).str.strip().str.upper()
 
-    # Intentar convertir columnas numéricas
+    # Intentar convertir columnas numéricas (solo si todos los valores se pueden convertir)
     for col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="ignore")
+        if _tipo_columna(df[col]) != object:
+            df[col] = pd.to_numeric(df[col])
 
     # ============================================================
     # 💾 Guardar versión limpia
@@ -212,8 +236,81 @@ def limpiar_recetas(file_path=None):
     return df
 
 
+# ============================================================
+# 🧱 Limpieza por bloques (archivos más grandes que la memoria)
+# ============================================================
+def limpiar_recetas_por_bloques(file_path=None, chunksize=FILAS_POR_BLOQUE):
+    """
+    Misma limpieza que limpiar_recetas, pero leyendo el CSV convertido en bloques:
+    una primera pasada decide el tipo de cada columna sobre todo el archivo; en la segunda
+    los duplicados se detectan con un conjunto de huellas de filas y cada bloque
+    limpio se agrega al CSV de salida. Devuelve la ruta del CSV limpio.
+    """
+    if file_path is None:
+        file_path = DATA_RAW / "recetas_calculo.xlsx"
+
+    print(f"Cargando archivo XLSX por bloques de {chunksize:,} filas: {file_path}")
+    temp_csv = _xlsx_a_csv_temporal(file_path)
+
+    output_csv = DATA_PROCESSED / "recetas_calculo_clean.csv"
+    vistas = set()
+    no_nulos = None
+    tipos = {}
+    n_leidas = n_finales = 0
+    try:
+        # 1ª pasada: tipo de cada columna sobre todo el archivo (no por bloque), para que una
+        # columna no quede numérica en unos bloques y texto en otros
+        for bloque in pd.read_csv(temp_csv, chunksize=chunksize, dtype=str):
+            bloque.columns = _normalizar_columnas(bloque.columns)
+            for col in bloque.columns:
+                if tipos.get(col) == object:
+                    continue
+                tipo = _tipo_columna(bloque[col].str.strip().str.upper())
+                tipos[col] = tipo if col not in tipos or tipo == object else np.result_type(tipos[col], tipo)
+
+        # 2ª pasada: limpieza, deduplicación y conversión con el tipo ya decidido
+        # (dtype=str: cada bloque parte del texto original y se convierte igual que en modo completo)
+        for i, bloque in enumerate(pd.read_csv(temp_csv, chunksize=chunksize, dtype=str)):
+            bloque.columns = _normalizar_columnas(bloque.columns)
+            n_leidas += len(bloque)
+
+            bloque = filtrar_duplicados(bloque.dropna(how="all"), vistas)
+            for col in bloque.columns:
+                texto = bloque[col].str.strip().str.upper()
+                if tipos[col] == object:
+                    # Igual que en modo completo: los vacíos de columnas de texto quedan como "NAN"
+                    bloque[col] = texto.fillna("NAN")
+                else:
+                    bloque[col] = pd.to_numeric(texto, errors="coerce").astype(tipos[col])
+
+            conteo = bloque.notna().sum()
+            no_nulos = conteo if no_nulos is None else no_nulos + conteo
+            bloque.to_csv(output_csv, index=False, encoding="utf-8", mode="w" if i == 0 else "a", header=(i == 0))
+            n_finales += len(bloque)
+            print(f"   … {n_leidas:,} filas leídas | {n_finales:,} filas limpias")
+    finally:
+        os.remove(temp_csv)
+    print(f"✅ CSV limpio guardado en: {output_csv}")
+
+    # Resumen equivalente a info() construido a partir de los conteos por bloque
+    lineas = [f"Filas: {n_finales} | Columnas: {len(tipos)}"]
+    if no_nulos is not None:
+        lineas += [f"{col}  {int(no_nulos[col])} non-null  {tipos[col]}" for col in no_nulos.index]
+    output_excel = REPORTS_DIR / "info_recetas_calculo.xlsx"
+    pd.DataFrame({"info": lineas}).to_excel(output_excel, index=False)
+    print(f"📄 Info guardada en: {output_excel}")
+
+    print(f"\n📊 Filas finales: {n_finales} | Filas leídas: {n_leidas}")
+    return output_csv
+
+
 # ============================================================
 # 🚀 Ejecución directa
 # ============================================================
 if __name__ == "__main__":
-    limpiar_recetas()
+    import sys
+    if "--bloques" in sys.argv:
+        i = sys.argv.index("--bloques")
+        limpiar_recetas_por_bloques(chunksize=int(sys.argv[i + 1]) if len(sys.argv) > i + 1 else FILAS_POR_BLOQUE)
+    else:
+        limpiar_recetas()
@@ -0,0 +1,170 @@
+# ============================================================
+# 💾 Escritura de Excel en modo streaming (memoria constante)
+# Escribe fila por fila con xlsxwriter (constant_memory) y reparte
+# automáticamente en varias hojas / archivos al superar el límite de Excel
+# ============================================================
+
+from __future__ import annotations
+import re
+from pathlib import Path
+
+import pandas as pd
+import xlsxwriter
+
+# Límite de filas por hoja en Excel (incluye la fila de encabezado)
+MAX_FILAS_EXCEL = 1_048_576
+# Longitud máxima del nombre de una hoja
+MAX_NOMBRE_HOJA = 31
+# Filas que se convierten a objetos Python en cada bloque
+FILAS_POR_BLOQUE = 50_000
+# Formato de las celdas de fecha/hora (el mismo que usa pandas.to_excel)
+FORMATO_FECHA = "yyyy-mm-dd hh:mm:ss"
+
+
+class EscritorExcelStreaming:
+    """
+    Escritor de libros Excel en modo streaming.
+
+    - Cada hoja lógica ("resultados", "sin_match", ...) se escribe por bloques
+      con `agregar(hoja, df)`; las filas se vuelcan a disco a medida que se escriben.
+    - Al llegar a `max_filas` se abre una hoja nueva (`resultados_2`, `resultados_3`, ...).
+    - Si se indica `max_hojas_por_archivo`, al completarlas se abre un archivo
+      nuevo (`<nombre>_parte2.xlsx`, ...).
+    - Las filas deben agregarse en orden (restricción de constant_memory).
+    """
+
+    def __init__(self, ruta, max_filas: int = MAX_FILAS_EXCEL, max_hojas_por_archivo: int | None = None):
+        if max_filas < 2:
+            raise ValueError("max_filas debe permitir al menos el encabezado y una fila de datos.")
+        self.ruta = Path(ruta)
+        self.max_filas = max_filas
+        self.max_hojas_por_archivo = max_hojas_por_archivo
+        self.rutas: list[Path] = []
+        self.filas_escritas = 0
+        self._libro = None
+        self._hojas_en_libro = 0
+        self._hojas: dict[str, dict] = {}
+        self._nombres_usados: set[str] = set()
+
+    # ------------ ciclo de vida ------------
+    def __enter__(self) -> "EscritorExcelStreaming":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cerrar()
+
+    def cerrar(self) -> None:
+        if self._libro is not None:
+            self._libro.close()
+            self._libro = None
+
+    # ------------ escritura ------------
+    def agregar(self, hoja: str, df: pd.DataFrame) -> None:
+        """Agrega las filas de `df` al final de la hoja lógica `hoja`."""
+        estado = self._hojas.get(hoja)
+        if estado is None:
+            estado = {"columnas": [str(c) for c in df.columns], "hoja": None, "fila": 0, "parte": 0}
+            self._hojas[hoja] = estado
+        elif list(map(str, df.columns)) != estado["columnas"]:
+            raise ValueError(f"Las columnas del bloque no coinciden con las de la hoja '{hoja}'.")
+
+        if estado["hoja"] is None:
+            self._nueva_hoja(hoja, estado)
+
+        n = len(df)
+        inicio = 0
+        while inicio < n:
+            if estado["fila"] >= self.max_filas:
+                self._nueva_hoja(hoja, estado)
+            fin = min(n, inicio + FILAS_POR_BLOQUE, inicio + self.max_filas - estado["fila"])
+            valores = df.iloc[inicio:fin].to_numpy(dtype=object)
+            valores[pd.isna(valores)] = None
+            ws = estado["hoja"]
+            fila = estado["fila"]
+            for registro in valores:
+                ws.write_row(fila, 0, registro)
+                fila += 1
+            estado["fila"] = fila
+            self.filas_escritas += fin - inicio
+            inicio = fin
+
+    def _nueva_hoja(self, hoja: str, estado: dict) -> None:
+        if (
+            self._libro is None
+            or (self.max_hojas_por_archivo and self._hojas_en_libro >= self.max_hojas_por_archivo)
+        ):
+            self._nuevo_libro()
+
+        estado["parte"] += 1
+        nombre = hoja if estado["parte"] == 1 else f"{hoja}_{estado['parte']}"
+        nombre = nombre[:MAX_NOMBRE_HOJA]
+        # Evita colisiones al truncar nombres largos
+        base, k = nombre, 1
+        while nombre.lower() in self._nombres_usados:
+            k += 1
+            sufijo = f"~{k}"
+            nombre = base[:MAX_NOMBRE_HOJA - len(sufijo)] + sufijo
+        self._nombres_usados.add(nombre.lower())
+
+        ws = self._libro.add_worksheet(nombre)
+        ws.write_row(0, 0, estado["columnas"])
+        estado["hoja"] = ws
+        estado["fila"] = 1
+        self._hojas_en_libro += 1
+
+    def _nuevo_libro(self) -> None:
+        self.cerrar()
+        n = len(self.rutas) + 1
+        ruta = self.ruta if n == 1 else self.ruta.with_name(f"{self.ruta.stem}_parte{n}{self.ruta.suffix}")
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        if n == 1:
+            # Partes de una escritura anterior más larga: se leerían como parte de este resultado
+            sobrantes = re.compile(re.escape(self.ruta.stem) + r"_parte\d+" + re.escape(self.ruta.suffix))
+            for viejo in ruta.parent.iterdir():
+                if sobrantes.fullmatch(viejo.name):
+                    viejo.unlink()
+        self._libro = xlsxwriter.Workbook(
+            str(ruta),
+            # Sin formato por defecto, las fechas quedarían como números de serie de Excel
+            {"constant_memory": True, "nan_inf_to_errors": True, "default_date_format": FORMATO_FECHA},
+        )
+        self.rutas.append(ruta)
+        self._hojas_en_libro = 0
+        self._nombres_usados = set()
+        # Las hojas del libro anterior quedan cerradas: se reabren en el nuevo
+        for estado in self._hojas.values():
+            estado["hoja"] = None
+
+
+def escribir_excel_streaming(ruta, hojas: dict[str, pd.DataFrame], **kwargs) -> list[Path]:
+    """
+    Escribe varias hojas en una sola pasada y devuelve la lista de archivos generados.
+    `hojas` se escribe en el orden del diccionario (p. ej. resultados → sin_match → metadatos).
+    """
+    with EscritorExcelStreaming(ruta, **kwargs) as escritor:
+        for nombre, df in hojas.items():
+            escritor.agregar(nombre, df)
+    return escritor.rutas
+
+
+def leer_hoja_streaming(ruta, hoja: str) -> pd.DataFrame:
+    """
+    Lee una hoja lógica escrita con EscritorExcelStreaming: concatena `hoja`, `hoja_2`, ...
+    de `ruta` y de sus archivos `<nombre>_parteN.xlsx`, en el orden en que se escribieron.
+    """
+    ruta = Path(ruta)
+    if not ruta.exists():
+        raise FileNotFoundError(f"No se encontró el archivo {ruta}")
+    patron = re.compile(re.escape(hoja) + r"(?:_(\d+))?")
+    partes = []
+    archivo, n = ruta, 1
+    while archivo.exists():
+        with pd.ExcelFile(archivo) as xls:
+            hojas = [(m, nombre) for nombre in xls.sheet_names if (m := patron.fullmatch(nombre))]
+            for _, nombre in sorted(hojas, key=lambda h: int(h[0].group(1) or 1)):
+                partes.append(pd.read_excel(xls, nombre))
+        n += 1
+        archivo = ruta.with_name(f"{ruta.stem}_parte{n}{ruta.suffix}")
+    if not partes:
+        raise ValueError(f"El archivo {ruta.name} no tiene la hoja '{hoja}'.")
+    return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,123 @@
+# ============================================================
+# 🍳 Factores de retención de nutrientes y de rendimiento por cocción
+# Tabla opcional data/processed/factores_retencion.csv (una fila por alimento o grupo TPCA
+# y método de cocción; una columna por nutriente con su factor de retención)
+# ============================================================
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calculo_nutricional_recetas import COL_CODIGO_TPCA, COL_GRUPO_TPCA, DATA_PROCESSED, normalize_code
+
+FILE_FACTORES = DATA_PROCESSED / "factores_retencion.csv"
+# Método de cocción del ingrediente en el archivo de recetas (opcional)
+COL_METODO = "metodo_coccion"
+# Peso cocido / peso crudo en la tabla de factores (opcional)
+COL_RENDIMIENTO = "rendimiento"
+COL_PESO_COCIDO = "peso_cocido_g"
+SUFIJO_RETENIDO = "_retenido"
+
+
+def _texto(valores) -> np.ndarray:
+    return pd.Series(valores, dtype=object).fillna("").astype(str).str.strip().str.upper().to_numpy(dtype=object)
+
+
+def _factorizar(valores) -> tuple[np.ndarray, np.ndarray]:
+    """Códigos enteros por fila y textos normalizados de los valores distintos (el último, vacío, para nulos)."""
+    codigos, distintos = pd.factorize(np.asarray(valores, dtype=object))
+    codigos = np.where(codigos < 0, len(distintos), codigos).astype(np.int64)
+    return codigos, np.append(_texto(distintos), "")
+
+
+class FactoresRetencion:
+    """
+    Matriz de factores (combinaciones × nutrientes) indexada por (código, grupo, método).
+
+    Columnas de la tabla: `grupo` (obligatoria), `codigo` y `metodo` (vacíos = todo el grupo /
+    cualquier método), `rendimiento` y una columna por nutriente (mismo nombre que en la TPCA).
+    Factores ausentes valen 1.
+
+    Para cada ingrediente se usa la combinación más específica: (código, grupo, método) →
+    (grupo, método) → (código, grupo) → (grupo). La última fila de la matriz es de unos
+    (ingredientes sin factor), de modo que aplicar los factores es un solo gather + producto.
+    """
+
+    def __init__(self, tabla: pd.DataFrame, nutri_cols: list[str]):
+        tabla = tabla.rename(columns=lambda c: str(c).strip().lower())
+        if COL_GRUPO_TPCA not in tabla.columns:
+            raise ValueError(f"❌ No se encontró la columna '{COL_GRUPO_TPCA}' en la tabla de factores.")
+        vacios = np.full(len(tabla), "", dtype=object)
+        codigos = tabla[COL_CODIGO_TPCA].map(normalize_code) if COL_CODIGO_TPCA in tabla.columns else vacios
+        metodos = tabla["metodo"] if "metodo" in tabla.columns else vacios
+        self._indice = pd.MultiIndex.from_arrays([_texto(codigos), _texto(tabla[COL_GRUPO_TPCA]), _texto(metodos)])
+        if self._indice.has_duplicates:
+            raise ValueError("La tabla de factores tiene combinaciones (código, grupo, método) repetidas.")
+        # Hay filas específicas por método: aplicarlas exige el método de cada ingrediente
+        self.con_metodo = bool((self._indice.get_level_values(2) != "").any())
+
+        self.nutrientes = [c for c in nutri_cols if c in tabla.columns]
+        self._posicion_nutrientes = np.array([nutri_cols.index(c) for c in self.nutrientes], dtype=int)
+        matriz = tabla[self.nutrientes].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        self.matriz = np.vstack([np.nan_to_num(matriz, nan=1.0), np.ones((1, len(self.nutrientes)))])
+
+        self.con_rendimiento = COL_RENDIMIENTO in tabla.columns
+        rendimiento = (
+            pd.to_numeric(tabla[COL_RENDIMIENTO], errors="coerce").fillna(1.0).to_numpy(dtype=float)
+            if self.con_rendimiento
+            else np.ones(len(tabla))
+        )
+        self.rendimiento = np.append(rendimiento, 1.0)
+
+        self.columnas = ([COL_PESO_COCIDO] if self.con_rendimiento else []) + [c + SUFIJO_RETENIDO for c in self.nutrientes]
+
+    def posiciones(self, codigos, grupos, metodos=None) -> np.ndarray:
+        """Fila de la matriz de factores para cada ingrediente (códigos y grupos ya normalizados)."""
+        # Cada columna se factoriza y solo sus valores distintos se normalizan como texto;
+        # las combinaciones se buscan una vez y se expanden a todas las filas
+        (cod_c, txt_c), (cod_g, txt_g) = _factorizar(codigos), _factorizar(grupos)
+        if metodos is None:
+            cod_m, txt_m = np.zeros(len(cod_g), dtype=np.int64), np.array([""], dtype=object)
+        else:
+            cod_m, txt_m = _factorizar(metodos)
+        clave = (cod_c * len(txt_g) + cod_g) * len(txt_m) + cod_m
+        inversa, unicas = pd.factorize(clave)
+
+        c = txt_c[unicas // (len(txt_g) * len(txt_m))]
+        g = txt_g[(unicas // len(txt_m)) % len(txt_g)]
+        m = txt_m[unicas % len(txt_m)]
+        vacio = np.full(len(unicas), "", dtype=object)
+        pos = np.full(len(unicas), -1, dtype=np.int64)
+        for nivel in [(c, g, m), (vacio, g, m), (c, g, vacio), (vacio, g, vacio)]:
+            faltan = pos < 0
+            if not faltan.any():
+                break
+            pos[faltan] = self._indice.get_indexer(pd.MultiIndex.from_arrays([a[faltan] for a in nivel]))
+        pos[pos < 0] = len(self.matriz) - 1
+        return pos[inversa]
+
+    def aplicar(self, valores: np.ndarray, peso: np.ndarray, posiciones: np.ndarray) -> pd.DataFrame:
+        """
+        Valores retenidos = valores crudos × factor de retención (gather de la matriz por posición
+        y un producto in situ); peso cocido = peso neto × rendimiento. Devuelve las columnas nuevas.
+        """
+        retenidos = np.take(self.matriz, posiciones, axis=0)
+        retenidos *= valores[:, self._posicion_nutrientes]
+        out = pd.DataFrame(retenidos, columns=[c + SUFIJO_RETENIDO for c in self.nutrientes])
+        if self.con_rendimiento:
+            out.insert(0, COL_PESO_COCIDO, peso * self.rendimiento[posiciones])
+        return out
+
+
+def cargar_factores(nutri_cols: list[str], path: Path | None = None) -> FactoresRetencion | None:
+    """Tabla de factores si existe (None si no hay archivo: el cálculo queda solo con valores crudos)."""
+    path = Path(path or FILE_FACTORES)
+    if not path.exists():
+        return None
+    tabla = pd.read_csv(path, sep=None, engine="python", dtype={COL_CODIGO_TPCA: str})
+    factores = FactoresRetencion(tabla, nutri_cols)
+    print(f"🍳 Factores de retención: {len(tabla)} combinaciones | {len(factores.nutrientes)} nutrientes")
+    return factores
@@ -0,0 +1,386 @@
+# ============================================================
+# 🧮 Optimizador de menús: combina recetas para cumplir metas nutricionales
+# por grupo etáreo minimizando costo o peso (generación de columnas sobre menús diarios, HiGHS)
+# ============================================================
+
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+from scipy.sparse import coo_matrix, vstack
+
+from calculo_nutricional_recetas import (
+    CLAVES_RECETA,
+    COL_PESO,
+    DATA_PROCESSED,
+    columnas_nutrientes,
+    totales_por_receta,
+)
+
+# Nutrientes con meta mínima diaria por defecto
+NUTRIENTES_META = [
+    "energaenerc_kcal",
+    "protenas_totalesprocnt_g",
+    "hierrofe_mg",
+    "vitamina_a_equivalentes_totalesvita_μg",
+    "vitamina_cvitc_mg",
+]
+# Metas por grupo etáreo (opcional): grupo_etareo_recet, nutriente, minimo
+FILE_METAS = DATA_PROCESSED / "metas_nutricionales.csv"
+TIEMPO_LIMITE_S = 10
+# Brecha relativa aceptada frente a la cota inferior
+BRECHA_OPTIMO = 0.01
+
+
+def cargar_metas(path: Path = FILE_METAS) -> pd.DataFrame:
+    """Tabla de metas mínimas diarias por grupo etáreo (vacía si el archivo no existe)."""
+    if not path.exists():
+        return pd.DataFrame(columns=["grupo_etareo_recet", "nutriente", "minimo"])
+    metas = pd.read_csv(path, sep=None, engine="python")
+    metas.columns = metas.columns.str.lower().str.strip()
+    return metas
+
+
+def metas_de_grupo(metas: pd.DataFrame, grupo_etareo: str) -> dict[str, float]:
+    """Metas {nutriente: mínimo diario} de un grupo etáreo a partir de la tabla de metas."""
+    sel = metas[metas["grupo_etareo_recet"].astype(str).str.strip().str.upper() == str(grupo_etareo).strip().upper()]
+    return dict(zip(sel["nutriente"], pd.to_numeric(sel["minimo"], errors="coerce")))
+
+
+def costos_desde_tabla(totales: pd.DataFrame, tabla: pd.DataFrame) -> pd.Series:
+    """
+    Costo por ración alineado con `totales` a partir de una tabla con `costo` y las columnas de
+    receta que tenga (al menos nombre_de_receta). Recetas sin costo quedan en NaN.
+    """
+    tabla = tabla.rename(columns=lambda c: str(c).strip().lower())
+    claves = [c for c in CLAVES_RECETA if c in tabla.columns and c in totales.columns]
+    if "costo" not in tabla.columns or "nombre_de_receta" not in claves:
+        raise ValueError("La tabla de costos debe tener las columnas 'nombre_de_receta' y 'costo'.")
+    costos = tabla.groupby(claves, dropna=False)["costo"].mean()
+    indice = pd.MultiIndex.from_frame(totales[claves]) if len(claves) > 1 else pd.Index(totales[claves[0]])
+    return pd.Series(costos.reindex(indice).to_numpy(), index=totales.index, name="costo")
+
+
+def _modelo_dia(candidatas, valores, minimos):
+    """
+    Restricciones de un día con matrices dispersas (sin bucles por variable): una receta por tiempo
+    y metas mínimas.
+
+    Los tiempos con las mismas candidatas (p. ej. dos refrigerios) son intercambiables: se agrupan y
+    cada variable entera x[grupo, candidata] cuenta cuántos de sus tiempos sirven esa receta, para no
+    recorrer el mismo día con los tiempos permutados.
+
+    El tope de repeticiones de cada receta dentro del día va como cota de su variable; solo las recetas
+    candidatas en más de un grupo (`compartidas`) necesitan una fila, que queda al final de la matriz.
+    Devuelve (matriz, lb, ub, receta_var, grupo_var, grupos, compartidas); grupos = tiempos de cada grupo
+    y el ub de las filas de `compartidas` lo fija quien resuelve.
+    """
+    grupos, representantes = [], []
+    for t, c in enumerate(candidatas):
+        for g, r in enumerate(representantes):
+            if np.array_equal(candidatas[r], c):
+                grupos[g].append(t)
+                break
+        else:
+            grupos.append([t])
+            representantes.append(t)
+
+    n_grupos, n_nutri = len(grupos), valores.shape[1]
+    receta_var = np.concatenate([candidatas[r] for r in representantes])
+    grupo_var = np.repeat(np.arange(n_grupos), [len(candidatas[r]) for r in representantes])
+    n_var = len(receta_var)
+    columnas = np.arange(n_var)
+
+    a_grupo = coo_matrix((np.ones(n_var), (grupo_var, columnas)), shape=(n_grupos, n_var))
+    a_meta = coo_matrix(
+        (valores[receta_var].ravel(), (np.tile(np.arange(n_nutri), n_var), np.repeat(columnas, n_nutri))),
+        shape=(n_nutri, n_var),
+    )
+    _, fila, veces = np.unique(receta_var, return_inverse=True, return_counts=True)
+    repetida = veces[fila] > 1
+    compartidas, fila = np.unique(receta_var[repetida], return_inverse=True)
+    a_rep = coo_matrix((np.ones(len(fila)), (fila, columnas[repetida])), shape=(len(compartidas), n_var))
+
+    tiempos_grupo = np.array([len(g) for g in grupos], dtype=float)
+    matriz = vstack([a_grupo, a_meta, a_rep]).tocsr()
+    lb = np.concatenate([tiempos_grupo, minimos, np.zeros(len(compartidas))])
+    ub = np.concatenate([tiempos_grupo, np.full(n_nutri, np.inf), np.zeros(len(compartidas))])
+    return matriz, lb, ub, receta_var, grupo_var, grupos, compartidas
+
+
+class _GeneradorMenus:
+    """
+    Generación de columnas sobre menús diarios. Los días son intercambiables, así que el modelo no
+    tiene índice de día: se eligen menús diarios y cuántos días se sirve cada uno (un modelo con
+    variables por día recorre cada menú con los días permutados y no cierra la brecha a tiempo).
+
+    - Maestro: y[m] = días en que se sirve el menú m; Σ y = días; por receta, Σ veces · y ≤ tope.
+      La última variable es un día "sin menú" con costo de penalización (mantiene el maestro factible).
+    - Subproblema: el menú de un día de menor costo reducido con los precios duales del maestro
+      (modelo entero pequeño: una receta por tiempo, metas mínimas, tope por receta).
+    """
+
+    def __init__(self, candidatas, valores, costo, minimos, max_repeticiones, fin):
+        self.costo = costo
+        self.n_recetas = len(valores)
+        self.max_repeticiones = max_repeticiones
+        self.fin = fin
+        (
+            self.matriz_dia, self.lb_dia, self.ub_dia, self.receta_var, self.grupo_var, self.grupos, self.compartidas
+        ) = _modelo_dia(candidatas, valores, minimos)
+        self.tiempos_var = np.array([len(g) for g in self.grupos], dtype=float)[self.grupo_var]
+        self.penalizacion = 10 * sum(np.max(np.abs(costo[c])) for c in candidatas) + 1
+        self.variables = []  # variables del modelo diario de cada menú generado (repetidas según su valor)
+        self.recetas = []  # recetas distintas de cada menú y cuántas veces aparecen
+        self.conteos = []
+        self.costos = []
+
+    def _restante(self) -> float:
+        return max(self.fin - time.perf_counter(), 0.1)
+
+    def _maestro(self, activos):
+        n = len(activos)
+        filas = np.concatenate([self.recetas[m] for m in activos]) if n else np.empty(0, dtype=np.int64)
+        valores = np.concatenate([self.conteos[m] for m in activos]) if n else np.empty(0)
+        columnas = np.repeat(np.arange(n), [len(self.recetas[m]) for m in activos])
+        a_rep = coo_matrix((valores, (filas, columnas)), shape=(self.n_recetas, n + 1)).tocsr()
+        return np.append([self.costos[m] for m in activos], self.penalizacion), a_rep, np.ones((1, n + 1))
+
+    def activos(self, tope) -> np.ndarray:
+        """Menús que caben en el tope de repeticiones restante de cada receta."""
+        return np.array(
+            [m for m in range(len(self.recetas)) if np.all(self.conteos[m] <= tope[self.recetas[m]])], dtype=int
+        )
+
+    def relajacion(self, tope, dias, brecha):
+        """
+        Resuelve la relajación lineal del maestro agregando menús hasta que ninguno mejore (o hasta
+        quedar a brecha/4 de la cota). Devuelve (lp, activos, cota) con la cota inferior Lagrangiana
+        lp + días · min(0, costo reducido); lp es None si ningún día puede cumplir las metas.
+        """
+        # Tope restante de cada receta: cota de sus variables y, si es candidata en varios tiempos, su fila
+        ub = self.ub_dia.copy()
+        ub[len(ub) - len(self.compartidas):] = tope[self.compartidas]
+        dia = LinearConstraint(self.matriz_dia, self.lb_dia, ub)
+        cotas_var = Bounds(0, np.minimum(self.tiempos_var, tope[self.receta_var]))
+        cota = -np.inf
+        while True:
+            activos = self.activos(tope)
+            c, a_rep, a_dias = self._maestro(activos)
+            lp = linprog(c, A_ub=a_rep, b_ub=tope, A_eq=a_dias, b_eq=[dias], bounds=(0, None), method="highs")
+            precio_dia, precio_receta = lp.eqlin.marginals[0], lp.ineqlin.marginals
+            sub = milp(
+                self.costo[self.receta_var] - precio_receta[self.receta_var],
+                constraints=dia,
+                integrality=np.ones(len(self.receta_var)),
+                bounds=cotas_var,
+                options={"time_limit": self._restante(), "mip_rel_gap": 1e-6},
+            )
+            if sub.x is None:
+                return (lp if len(activos) else None), activos, cota
+            cota = max(cota, lp.fun + dias * min(0.0, getattr(sub, "mip_dual_bound", sub.fun) - precio_dia))
+            usadas = np.flatnonzero(sub.x > 0.5)
+            elegidas = np.repeat(usadas, np.round(sub.x[usadas]).astype(int))
+            if (
+                sub.fun - precio_dia > -1e-9 * max(1.0, abs(lp.fun))
+                or lp.fun - cota <= brecha / 4 * abs(lp.fun)
+                or any(np.array_equal(elegidas, v) for v in self.variables)
+                or time.perf_counter() > self.fin
+            ):
+                return lp, activos, cota
+            recetas, conteos = np.unique(self.receta_var[elegidas], return_counts=True)
+            self.variables.append(elegidas)
+            self.recetas.append(recetas)
+            self.conteos.append(conteos)
+            self.costos.append(self.costo[self.receta_var[elegidas]].sum())
+
+    def entero(self, dias, brecha):
+        """Maestro entero sobre todos los menús generados: {menú: días} o None si no hay solución sin penalización."""
+        tope = np.full(self.n_recetas, float(self.max_repeticiones))
+        activos = self.activos(tope)
+        c, a_rep, a_dias = self._maestro(activos)
+        res = milp(
+            c,
+            constraints=[LinearConstraint(a_dias, dias, dias), LinearConstraint(a_rep, -np.inf, tope)],
+            integrality=np.ones(len(c)),
+            bounds=Bounds(0, dias),
+            options={"time_limit": self._restante(), "mip_rel_gap": brecha},
+        )
+        if res.x is None or res.x[-1] > 0.5:
+            return None
+        usos = np.round(res.x[:-1]).astype(int)
+        return {int(activos[m]): int(usos[m]) for m in np.flatnonzero(usos)}
+
+    def menu(self, m) -> tuple[np.ndarray, np.ndarray]:
+        """(recetas, tiempos) del menú m: las recetas de cada grupo se reparten entre sus tiempos."""
+        variables = self.variables[m]
+        grupo = self.grupo_var[variables]
+        orden = np.argsort(grupo, kind="stable")
+        variables, grupo = variables[orden], grupo[orden]
+        dentro = np.arange(len(grupo)) - np.searchsorted(grupo, grupo)
+        tiempos = np.array([self.grupos[g][j] for g, j in zip(grupo, dentro)], dtype=int)
+        return self.receta_var[variables], tiempos
+
+    def costo_de(self, solucion) -> float:
+        return float(sum(self.costos[m] * k for m, k in solucion.items()))
+
+
+def _resolver(candidatas, valores, costo, minimos, dias, max_repeticiones, tiempo_limite, brecha):
+    """
+    1. Relajación del maestro en la raíz → cota inferior
+    2. Inmersión: se fija el menú más usado de la relajación, se descuenta su día y sus recetas del
+       tope y se vuelve a generar columnas sobre lo que queda, hasta completar los días
+    3. Maestro entero sobre todos los menús generados; se queda la mejor de las dos soluciones
+
+    Devuelve (menus, usos, objetivo, cota): (recetas, tiempos) de cada menú elegido y cuántos días
+    se sirve; menus es None si no hay (o no se encontró) un menú factible.
+    """
+    generador = _GeneradorMenus(candidatas, valores, costo, minimos, max_repeticiones, time.perf_counter() + tiempo_limite)
+    tope = np.full(len(valores), float(max_repeticiones))
+    lp, activos, cota = generador.relajacion(tope, dias, brecha)
+    if lp is None:
+        return None, None, np.nan, np.nan
+
+    soluciones = []
+    fijos, restantes = {}, dias
+    while lp is not None and lp.x[-1] < 1e-6 and time.perf_counter() < generador.fin:
+        y = lp.x[:-1]
+        if np.allclose(y, np.round(y), atol=1e-6):
+            for i in np.flatnonzero(np.round(y)):
+                fijos[int(activos[i])] = fijos.get(int(activos[i]), 0) + int(round(y[i]))
+            soluciones.append(fijos)
+            break
+        i = int(np.argmax(y))
+        m, k = int(activos[i]), max(1, int(np.floor(y[i] + 1e-6)))
+        fijos[m] = fijos.get(m, 0) + k
+        restantes -= k
+        tope[generador.recetas[m]] -= k * generador.conteos[m]
+        if restantes == 0:
+            soluciones.append(fijos)
+            break
+        lp, activos, _ = generador.relajacion(tope, restantes, brecha)
+
+    entera = generador.entero(dias, brecha)
+    if entera is not None:
+        soluciones.append(entera)
+    if not soluciones:
+        return None, None, np.nan, cota
+    mejor = min(soluciones, key=generador.costo_de)
+    return [generador.menu(m) for m in mejor], np.array(list(mejor.values())), generador.costo_de(mejor), cota
+
+
+def optimizar_menu(
+    totales: pd.DataFrame,
+    metas: dict[str, float],
+    dias: int = 5,
+    tiempos: dict[str, list[str]] | None = None,
+    max_repeticiones: int = 1,
+    costos: pd.Series | None = None,
+    tiempo_limite: float = TIEMPO_LIMITE_S,
+    brecha: float = BRECHA_OPTIMO,
+) -> tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """
+    Elige una receta por día y tiempo de comida de modo que cada día cumpla las metas mínimas.
+
+    - `totales`: nutrientes por receta (totales_por_receta), ya filtrado al grupo etáreo / UT
+    - `metas`: {nutriente: mínimo diario}
+    - `tiempos`: {nombre del tiempo: tipos de receta permitidos}; por defecto un tiempo por tipo_receta
+    - `max_repeticiones`: veces que una misma receta puede aparecer en todo el periodo
+    - `costos`: costo por ración con el mismo índice que `totales` (las recetas sin costo no se consideran);
+      si no se indica, se minimiza el peso por ración
+    - `brecha`: distancia relativa máxima a la cota inferior con la que el solver se detiene
+    - `tiempo_limite`: segundos de búsqueda; al agotarse se devuelve el mejor menú factible encontrado
+
+    Devuelve (menu, resumen_diario, estado), con estado = {"optimo", "brecha", "objetivo", "cota", "mensaje",
+    "candidatas"}: "brecha" es la distancia relativa entre el objetivo y la cota inferior y "optimo" indica
+    que no supera `brecha`. Si el tiempo se agotó antes de tener cota, "cota" es -inf y "brecha" inf.
+    Los días salen ordenados por costo (un menú servido varios días aparece en días consecutivos).
+    Lanza ValueError si no existe (o no se encontró a tiempo) un menú factible.
+    """
+    if totales.empty:
+        raise ValueError("No hay recetas candidatas con los filtros seleccionados.")
+    faltantes = [n for n in metas if n not in totales.columns]
+    if faltantes:
+        raise ValueError(f"Nutrientes sin datos en el resultado: {faltantes}")
+    if tiempos is None:
+        tiempos = {t: [t] for t in sorted(totales["tipo_receta"].dropna().unique())}
+
+    costo = pd.to_numeric(costos.reindex(totales.index) if costos is not None else totales[COL_PESO], errors="coerce")
+    costo = costo.to_numpy(dtype=float)
+    totales = totales.reset_index(drop=True)
+    nutrientes = list(metas)
+    minimos = np.array([metas[n] for n in nutrientes], dtype=float)
+    valores = np.nan_to_num(totales[nutrientes].to_numpy(dtype=float))
+
+    # Candidatas de cada tiempo según los tipos permitidos
+    tipo = totales["tipo_receta"].to_numpy()
+    con_costo = ~np.isnan(costo)
+    candidatas = [np.flatnonzero(np.isin(tipo, permitidos) & con_costo) for permitidos in tiempos.values()]
+    vacios = [t for t, c in zip(tiempos, candidatas) if len(c) == 0]
+    if vacios:
+        raise ValueError(f"No hay recetas candidatas para: {vacios}")
+
+    menus, usos, objetivo, cota = _resolver(candidatas, valores, costo, minimos, dias, max_repeticiones, tiempo_limite, brecha)
+    if menus is None:
+        raise ValueError("No existe (o no se encontró a tiempo) un menú que cumpla las metas con estas restricciones.")
+
+    # Días en orden de costo: cada menú se repite tantos días como indica el maestro
+    orden = np.argsort([costo[recetas].sum() for recetas, _ in menus], kind="stable")
+    por_dia = [menus[m] for m in orden for _ in range(usos[m])]
+    recetas_menu = np.concatenate([recetas for recetas, _ in por_dia])
+    tiempos_menu = np.concatenate([t for _, t in por_dia])
+    dia_menu = np.repeat(np.arange(1, len(por_dia) + 1), [len(r) for r, _ in por_dia])
+    orden_filas = np.lexsort((tiempos_menu, dia_menu))
+
+    nombres_tiempo = np.array(list(tiempos))
+    menu = totales.iloc[recetas_menu[orden_filas]].reset_index(drop=True)
+    menu.insert(0, "tiempo", nombres_tiempo[tiempos_menu[orden_filas]])
+    menu.insert(0, "dia", dia_menu[orden_filas])
+    menu["costo"] = costo[recetas_menu[orden_filas]]
+
+    resumen = menu.groupby("dia")[nutrientes + ["costo"]].sum().reset_index()
+    for n, minimo in zip(nutrientes, minimos):
+        resumen[f"{n}_meta"] = minimo
+    if np.isfinite(cota):
+        brecha_final = max((objetivo - cota) / max(abs(objetivo), 1e-9), 0.0)
+        optimo = bool(brecha_final <= brecha + 1e-9)
+        mensaje = f"{'Menú óptimo' if optimo else 'Mejor menú encontrado'} (brecha {brecha_final:.2%} frente a la cota inferior)"
+    else:
+        # Sin cota inferior (tiempo agotado antes de la primera) no se puede medir la brecha
+        brecha_final, optimo = np.inf, False
+        mensaje = "Mejor menú encontrado (sin cota inferior: no se pudo medir la brecha al óptimo)"
+    estado = {
+        "optimo": optimo,
+        "brecha": brecha_final,
+        "objetivo": objetivo,
+        "cota": cota,
+        "mensaje": mensaje,
+        "candidatas": int(sum(len(c) for c in candidatas)),
+    }
+    return menu, resumen, estado
+
+
+def optimizar_menu_desde_resultado(
+    df_final: pd.DataFrame,
+    grupo_etareo: str,
+    metas: dict[str, float] | None = None,
+    ut: list[str] | None = None,
+    **kwargs,
+) -> tuple[pd.DataFrame, pd.DataFrame, dict]:
+    """
+    Atajo sobre el resultado por ingrediente: calcula los totales por receta, filtra por grupo etáreo
+    (y UT) y toma las metas de `metas` o, si no se indican, de data/processed/metas_nutricionales.csv.
+    """
+    totales = totales_por_receta(df_final, columnas_nutrientes(df_final))
+    totales = totales[totales["grupo_etareo_recet"] == grupo_etareo]
+    if ut:
+        totales = totales[totales["ut"].isin(ut)]
+    if metas is None:
+        metas = metas_de_grupo(cargar_metas(), grupo_etareo)
+    if not metas:
+        raise ValueError(f"No hay metas definidas para el grupo etáreo '{grupo_etareo}'.")
+    return optimizar_menu(totales, metas, **kwargs)
@@ -0,0 +1,193 @@
+# ============================================================
+# 🛒 Planificación de compras: gramos totales de cada alimento TPCA por UT
+# a partir de un plan de raciones (UT × receta × número de raciones)
+# Uso: python planificacion_compras.py plan_raciones.xlsx [--salida compras.xlsx]
+# ============================================================
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from calculo_nutricional_recetas import (
+    CLAVES_RECETA,
+    COL_CODIGO_RECETA,
+    COL_GRUPO_RECETA,
+    COL_PESO,
+    REPORTS_DIR,
+)
+from exportar_excel import MAX_NOMBRE_HOJA, EscritorExcelStreaming
+
+COL_RACIONES = "raciones"
+COL_INGREDIENTE = "ingrediente_registrado"
+OUTPUT_COMPRAS = REPORTS_DIR / "compras_por_ut.xlsx"
+
+
+def _normalizar_texto(df: pd.DataFrame) -> pd.DataFrame:
+    """Claves de receta comparables entre el plan y el resultado (texto, sin espacios, mayúsculas)."""
+    return df.apply(lambda s: s.astype(str).str.strip().str.upper())
+
+
+class PlanificadorCompras:
+    """
+    Precalcula sobre `df_final` (resultado por ingrediente de calcular_info_nutricional):
+    - el índice de recetas (CLAVES_RECETA) y, por receta, el rango de sus filas de ingredientes
+    - el identificador de alimento (código, grupo TPCA) y el peso neto por ración de cada fila
+
+    `calcular` resuelve el plan como un producto disperso raciones (UT × receta) ·
+    gramos (receta × alimento), expandiendo cada fila del plan solo sobre los ingredientes
+    de su receta y acumulando con un único np.bincount.
+    """
+
+    def __init__(self, df_final: pd.DataFrame):
+        for col in [COL_CODIGO_RECETA, COL_GRUPO_RECETA, COL_PESO]:
+            if col not in df_final.columns:
+                raise ValueError(f"❌ No se encontró la columna '{col}' en el resultado.")
+        self.claves_receta = [c for c in CLAVES_RECETA if c in df_final.columns]
+        if "ut" not in self.claves_receta or "nombre_de_receta" not in self.claves_receta:
+            raise ValueError("El resultado debe tener las columnas 'ut' y 'nombre_de_receta'.")
+
+        # Recetas y filas de ingredientes agrupadas por receta (estructura tipo CSR)
+        grupos_receta = df_final.groupby(self.claves_receta, sort=False, dropna=False)
+        receta_id = grupos_receta.ngroup().to_numpy()
+        self.recetas = grupos_receta.size().reset_index(name="n_ingredientes")
+        self._indice_recetas = pd.MultiIndex.from_frame(_normalizar_texto(self.recetas[self.claves_receta]))
+        self._orden = np.argsort(receta_id, kind="stable")
+        self._inicio = np.concatenate([[0], np.cumsum(self.recetas["n_ingredientes"].to_numpy())])
+
+        # Alimentos (código, grupo) y peso por ración de cada fila
+        grupos_alimento = df_final.groupby([COL_CODIGO_RECETA, COL_GRUPO_RECETA], sort=True, dropna=False)
+        self._alimento_id = grupos_alimento.ngroup().to_numpy()
+        self.alimentos = (
+            grupos_alimento[COL_INGREDIENTE].first().reset_index()
+            if COL_INGREDIENTE in df_final.columns
+            else grupos_alimento.size().reset_index()[[COL_CODIGO_RECETA, COL_GRUPO_RECETA]]
+        )
+        self._peso = pd.to_numeric(df_final[COL_PESO], errors="coerce").fillna(0).to_numpy(dtype=float)
+
+    def plantilla(self) -> pd.DataFrame:
+        """Plan vacío (todas las recetas con 0 raciones) para completar y volver a cargar."""
+        return self.recetas[self.claves_receta].assign(**{COL_RACIONES: 0})
+
+    def calcular(self, plan: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Devuelve (compras, sin_receta):
+        - `compras`: ut, código y grupo TPCA, ingrediente, cantidad_g y cantidad_kg
+          (solo alimentos con cantidad > 0)
+        - `sin_receta`: filas del plan cuya receta no existe en el resultado (no se suman)
+
+        `plan` debe tener las columnas de receta del resultado (ut, tipo_receta, grupo_etareo_recet,
+        nombre_de_receta) y `raciones`. Filas repetidas del plan se acumulan.
+        """
+        plan = plan.rename(columns=lambda c: str(c).strip().lower())
+        faltantes = [c for c in self.claves_receta + [COL_RACIONES] if c not in plan.columns]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en el plan de raciones: {faltantes}")
+
+        raciones = pd.to_numeric(plan[COL_RACIONES], errors="coerce").fillna(0).to_numpy(dtype=float)
+        receta = self._indice_recetas.get_indexer(pd.MultiIndex.from_frame(_normalizar_texto(plan[self.claves_receta])))
+        sin_receta = plan[(receta < 0) & (raciones != 0)]
+        validas = (receta >= 0) & (raciones != 0)
+        receta, raciones = receta[validas], raciones[validas]
+        uts = pd.Categorical(self.recetas["ut"].to_numpy()[receta])
+        ut_id = uts.codes
+
+        # Expansión: cada fila del plan × ingredientes de su receta
+        n_ing = self._inicio[receta + 1] - self._inicio[receta]
+        fila_plan = np.repeat(np.arange(len(receta)), n_ing)
+        desplazamiento = np.arange(len(fila_plan)) - np.repeat(np.cumsum(n_ing) - n_ing, n_ing)
+        filas = self._orden[self._inicio[receta][fila_plan] + desplazamiento]
+
+        n_alimentos = len(self.alimentos)
+        celda = ut_id[fila_plan].astype(np.int64) * n_alimentos + self._alimento_id[filas]
+        n_celdas = len(uts.categories) * n_alimentos
+        gramos = np.bincount(celda, weights=raciones[fila_plan] * self._peso[filas], minlength=n_celdas)
+
+        con_compra = np.flatnonzero(gramos > 0)
+        ut_idx, alimento_idx = np.divmod(con_compra, n_alimentos)
+        compras = self.alimentos.iloc[alimento_idx].reset_index(drop=True)
+        compras.insert(0, "ut", uts.categories[ut_idx])
+        compras["cantidad_g"] = gramos[con_compra]
+        compras["cantidad_kg"] = compras["cantidad_g"] / 1000
+        return compras, sin_receta.reset_index(drop=True)
+
+
+def _nombre_hoja(valor) -> str:
+    """Nombre de hoja válido para Excel a partir del valor de UT."""
+    return re.sub(r"[\[\]:*?/\\]", "_", str(valor)).strip("'") or "sin_ut"
+
+
+def _nombres_hojas_ut(uts, reservados=()) -> dict:
+    """
+    Nombre de hoja único para cada UT. Excel no distingue mayúsculas y corta en 31 caracteres,
+    así que dos UT pueden limpiarse al mismo nombre ("A/B" y "A_B"): la segunda se renombra
+    explícitamente con un sufijo (`A_B~2`). `reservados` son hojas que ya usa el libro.
+    """
+    usados = {str(r).lower() for r in reservados}
+    nombres = {}
+    for ut in uts:
+        base = _nombre_hoja(ut)[:MAX_NOMBRE_HOJA]
+        nombre, k = base, 1
+        while nombre.lower() in usados:
+            k += 1
+            sufijo = f"~{k}"
+            nombre = base[:MAX_NOMBRE_HOJA - len(sufijo)] + sufijo
+        usados.add(nombre.lower())
+        nombres[ut] = nombre
+    return nombres
+
+
+def exportar_compras(compras: pd.DataFrame, ruta=None, sin_receta: pd.DataFrame | None = None) -> list[Path]:
+    """
+    Exporta la lista de compras: una hoja `consolidado` (todas las UT sumadas), una hoja `hojas_ut`
+    (UT → nombre de su hoja) y una hoja por UT, que conserva la columna `ut`.
+    Devuelve los archivos generados.
+    """
+    ruta = Path(ruta or OUTPUT_COMPRAS)
+    claves_alimento = [c for c in compras.columns if c not in ("ut", "cantidad_g", "cantidad_kg")]
+    consolidado = (
+        compras.groupby(claves_alimento, sort=True, dropna=False)[["cantidad_g", "cantidad_kg"]].sum().reset_index()
+    )
+    por_ut = list(compras.groupby("ut", sort=True))
+    hojas = _nombres_hojas_ut([ut for ut, _ in por_ut], reservados=["consolidado", "hojas_ut", "sin_receta"])
+    with EscritorExcelStreaming(ruta) as escritor:
+        escritor.agregar("consolidado", consolidado)
+        escritor.agregar("hojas_ut", pd.DataFrame({"ut": list(hojas), "hoja": list(hojas.values())}))
+        for ut, df_ut in por_ut:
+            escritor.agregar(hojas[ut], df_ut)
+        if sin_receta is not None and not sin_receta.empty:
+            escritor.agregar("sin_receta", sin_receta)
+    return escritor.rutas
+
+# ============================================================
+# 🚀 Ejecución directa
+# ============================================================
+if __name__ == "__main__":
+    import argparse
+
+    from almacen_resultados import consultar_ingredientes, listar_ejecuciones
+    from calculo_nutricional_recetas import leer_publicacion
+
+    parser = argparse.ArgumentParser(description="Lista de compras por UT a partir de un plan de raciones.")
+    parser.add_argument("plan", type=Path, help="CSV o Excel con ut, tipo_receta, grupo_etareo_recet, nombre_de_receta, raciones")
+    parser.add_argument("--salida", type=Path, default=OUTPUT_COMPRAS, help="Excel de salida")
+    args = parser.parse_args()
+
+    # Último resultado publicado; si no hay pickle, la última ejecución del historial
+    publicacion = leer_publicacion()
+    if publicacion and publicacion.get("pickle") and Path(publicacion["pickle"]).exists():
+        df_final = pd.read_pickle(publicacion["pickle"])
+    else:
+        ejecuciones = listar_ejecuciones()
+        if ejecuciones.empty:
+            raise SystemExit("⚠️ Aún no hay resultados calculados.")
+        df_final = consultar_ingredientes(int(ejecuciones["run_id"].iloc[0]))
+
+    plan = pd.read_csv(args.plan) if args.plan.suffix.lower() == ".csv" else pd.read_excel(args.plan)
+    compras, sin_receta = PlanificadorCompras(df_final).calcular(plan)
+    for ruta in exportar_compras(compras, args.salida, sin_receta):
+        print(f"✅ Lista de compras guardada en: {ruta}")
+    print(f"🛒 UT: {compras['ut'].nunique()} | Alimentos: {len(compras)} | Filas del plan sin receta: {len(sin_receta)}")
@@ -0,0 +1,37 @@
+# ============================================================
+# 🧱 Utilidades del modo por bloques (archivos más grandes que la memoria)
+# Compartidas por la limpieza (clean_recetas_calculo) y el cálculo (calculo_nutricional_recetas)
+# ============================================================
+
+import csv
+
+import numpy as np
+import pandas as pd
+
+# Filas por bloque en el modo por bloques (memoria acotada)
+FILAS_POR_BLOQUE = 100_000
+
+
+def detectar_separador(path):
+    """Detecta el separador leyendo solo el inicio del archivo (permite usar el motor C de pandas)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        muestra = f.read(64 * 1024)
+    try:
+        return csv.Sniffer().sniff(muestra, delimiters=",;\t|").delimiter
+    except csv.Error:
+        return ","
+
+
+def huellas_filas(df):
+    """Huella (hash de 64 bits) de cada fila, para deduplicar entre bloques sin guardar las filas."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def filtrar_duplicados(df, vistas: set):
+    """Elimina las filas ya vistas (en este bloque o en bloques anteriores) y registra las nuevas huellas."""
+    huellas = huellas_filas(df)
+    nuevas = ~pd.Series(huellas).duplicated().to_numpy()
+    if vistas:
+        nuevas &= np.fromiter((h not in vistas for h in huellas.tolist()), dtype=bool, count=len(huellas))
+    vistas.update(huellas[nuevas].tolist())
+    return df[nuevas]
@@ -0,0 +1,101 @@
+# ============================================================
+# 🏆 Ranking de recetas por nutriente y densidad nutricional
+# Ej: "las 20 recetas con más hierro por 100 kcal en la UT X para el grupo etáreo Y"
+# ============================================================
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from calculo_nutricional_recetas import COL_PESO, columnas_nutrientes, totales_por_receta
+from factores_retencion import COL_PESO_COCIDO
+
+COL_ENERGIA = "energaenerc_kcal"
+
+# Bases de comparación disponibles
+BASES = {
+    "racion": "por ración",
+    "kcal": "por 100 kcal",
+    "100g": "por 100 g",
+}
+
+
+class RankingNutrientes:
+    """
+    Precalcula, a partir del resultado por ingrediente:
+    - los totales por receta (matriz recetas × nutrientes)
+    - las densidades por 100 kcal y por 100 g de `peso_neto__racion_g`
+    - los códigos de categoría de UT / tipo / grupo etáreo para filtrar sin comparar texto
+
+    `top_k` selecciona con partición parcial (np.argpartition) y solo ordena los k elegidos.
+    """
+
+    def __init__(self, df_final: pd.DataFrame, nutri_cols: list[str] | None = None, col_energia: str = COL_ENERGIA):
+        if nutri_cols is None:
+            nutri_cols = columnas_nutrientes(df_final)
+        totales = totales_por_receta(df_final, nutri_cols)
+        # Los pesos (neto y, con factores de retención, cocido) no son nutrientes a rankear
+        self.nutri_cols = [c for c in nutri_cols if c in totales.columns and c not in (COL_PESO, COL_PESO_COCIDO)]
+        self.claves_receta = [c for c in totales.columns if c not in self.nutri_cols and c not in (COL_PESO, COL_PESO_COCIDO)]
+        self.recetas = totales[self.claves_receta + [COL_PESO]].reset_index(drop=True)
+
+        matriz = totales[self.nutri_cols].to_numpy(dtype=float)
+        peso = totales[COL_PESO].to_numpy(dtype=float)
+        energia = totales[col_energia].to_numpy(dtype=float) if col_energia in totales.columns else np.full(len(totales), np.nan)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.densidades = {
+                "racion": matriz,
+                "kcal": np.where(energia[:, None] > 0, matriz / energia[:, None] * 100.0, np.nan),
+                "100g": np.where(peso[:, None] > 0, matriz / peso[:, None] * 100.0, np.nan),
+            }
+        self._col_idx = {c: i for i, c in enumerate(self.nutri_cols)}
+        self._categorias = {
+            c: pd.Categorical(self.recetas[c]) for c in self.claves_receta
+        }
+
+    def _mascara(self, filtros: dict) -> np.ndarray | None:
+        mascara = None
+        for col, valores in filtros.items():
+            if not valores or col not in self._categorias:
+                continue
+            cat = self._categorias[col]
+            codigos = cat.categories.get_indexer(list(valores))
+            m = np.isin(cat.codes, codigos[codigos >= 0])
+            mascara = m if mascara is None else mascara & m
+        return mascara
+
+    def top_k(self, nutriente: str, k: int = 20, base: str = "racion", ascendente: bool = False, **filtros) -> pd.DataFrame:
+        """
+        Devuelve las k recetas con mayor (o menor, si `ascendente`) valor del nutriente.
+
+        `base`: "racion" (total por ración), "kcal" (por 100 kcal) o "100g" (por 100 g).
+        `filtros`: listas de valores por columna de receta, p. ej. ut=["UT_1"], grupo_etareo_recet=[...].
+        """
+        if nutriente not in self._col_idx:
+            raise ValueError(f"El nutriente '{nutriente}' no está en el resultado.")
+        if base not in self.densidades:
+            raise ValueError(f"Base no válida: '{base}'. Opciones: {list(BASES)}")
+
+        valores = self.densidades[base][:, self._col_idx[nutriente]]
+        filas = np.flatnonzero(~np.isnan(valores))
+        mascara = self._mascara(filtros)
+        if mascara is not None:
+            filas = filas[mascara[filas]]
+
+        clave = valores[filas] if ascendente else -valores[filas]
+        k = max(0, min(k, len(filas)))
+        if k == 0:
+            return self.recetas.iloc[[]].assign(**{nutriente: []})
+        if k < len(filas):
+            parcial = np.argpartition(clave, k - 1)[:k]
+        else:
+            parcial = np.arange(len(filas))
+        elegidas = filas[parcial[np.argsort(clave[parcial], kind="stable")]]
+
+        out = self.recetas.iloc[elegidas].reset_index(drop=True)
+        out[nutriente] = valores[elegidas]
+        if base != "racion":
+            out[f"{nutriente}_racion"] = self.densidades["racion"][elegidas, self._col_idx[nutriente]]
+        return out
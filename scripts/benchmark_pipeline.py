@@ -0,0 +1,259 @@
+# ============================================================
+# ⏱️ Benchmark del pipeline de cálculo nutricional (datos sintéticos)
+# Uso: python scripts/benchmark_pipeline.py [n_filas ...]
+# ============================================================
+
+import sys
+import time
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from exportar_excel import EscritorExcelStreaming  # noqa: E402
+from ranking_nutrientes import RankingNutrientes  # noqa: E402
+from analitica_distribucion import DistribucionNutrientes  # noqa: E402
+from planificacion_compras import PlanificadorCompras  # noqa: E402
+from optimizador_menus import TIEMPO_LIMITE_S, optimizar_menu  # noqa: E402
+from factores_retencion import FactoresRetencion  # noqa: E402
+import almacen_resultados  # noqa: E402
+import calculo_nutricional_recetas as calculo  # noqa: E402
+
+FILE_TPCA = BASE_DIR / "data" / "processed" / "tablas_peruanas_clean.csv"
+
+# ============================================================
+# 🧪 Datos sintéticos
+# ============================================================
+def generar_recetas_sinteticas(n_filas: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Genera un archivo de recetas limpio (formato recetas_calculo_clean.csv)
+    usando códigos reales de la TPCA. Cada receta tiene ~8 ingredientes.
+    """
+    rng = np.random.default_rng(seed)
+    tpca = pd.read_csv(FILE_TPCA, sep=None, engine="python", on_bad_lines="skip")
+    idx = rng.integers(0, len(tpca), n_filas)
+    n_recetas = max(1, n_filas // 8)
+    receta = pd.Series(rng.integers(0, n_recetas, n_filas))
+
+    df = pd.DataFrame({
+        "ut": "UT_" + (receta % 25).astype(str),
+        "tipo_receta": np.array(["DESAYUNO", "ALMUERZO", "CENA"])[receta.to_numpy() % 3],
+        "grupo_etareo_recet": np.array(["3-5 AÑOS", "6-11 AÑOS", "12-17 AÑOS"])[(receta.to_numpy() // 3) % 3],
+        "nombre_de_receta": "RECETA_" + receta.astype(str),
+        "ingrediente_registrado": tpca["nombre_del_alimento"].to_numpy()[idx],
+        "codigo_del_alimento_tpca_2017": tpca["codigo"].to_numpy()[idx],
+        "grupo_alimento_tpca2017": tpca["grupo"].to_numpy()[idx],
+        "peso_neto__racion_g": rng.uniform(2, 150, n_filas).round(1),
+    })
+    # Columnas informativas de relleno hasta completar las 20 del archivo real
+    for i in range(len(df.columns), 20):
+        df[f"campo_{i}"] = "X"
+    return df.sort_values(["nombre_de_receta"], kind="stable").reset_index(drop=True)
+
+
+def generar_resultado_sintetico(n_filas: int, n_nutrientes: int = 24, seed: int = 0) -> pd.DataFrame:
+    """DataFrame con la forma de df_final (20 columnas de receta + nutrientes)."""
+    rng = np.random.default_rng(seed)
+    df = generar_recetas_sinteticas(n_filas, seed)
+    nutrientes = rng.uniform(0, 50, (n_filas, n_nutrientes))
+    nutrientes[rng.random((n_filas, n_nutrientes)) < 0.05] = np.nan
+    return pd.concat([df, pd.DataFrame(nutrientes, columns=[f"nutriente_{i}" for i in range(n_nutrientes)])], axis=1)
+
+
+def _medir(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+# ============================================================
+# 💾 Exportación Excel
+# ============================================================
+def bench_exportacion(n_filas: int) -> None:
+    df = generar_resultado_sintetico(n_filas)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+
+        t_pandas = _medir(lambda: df.to_excel(tmp / "pandas.xlsx", index=False))
+
+        def _streaming(max_filas=None):
+            kwargs = {"max_filas": max_filas} if max_filas else {}
+            with EscritorExcelStreaming(tmp / "streaming.xlsx", **kwargs) as escritor:
+                escritor.agregar("resultados", df)
+            return escritor
+
+        t_stream = _medir(_streaming)
+        # Partición forzada: hojas de n/4 filas para medir el coste del corte
+        t_split = _medir(lambda: _streaming(max_filas=max(2, n_filas // 4)))
+
+    print(f"[exportacion] filas={n_filas:,}")
+    print(f"  pandas.to_excel     : {t_pandas:8.2f} s | {n_filas / t_pandas:12,.0f} filas/s")
+    print(f"  streaming           : {t_stream:8.2f} s | {n_filas / t_stream:12,.0f} filas/s")
+    print(f"  streaming (4 hojas) : {t_split:8.2f} s | {n_filas / t_split:12,.0f} filas/s")
+
+# ============================================================
+# 🏆 Ranking top-k
+# ============================================================
+def bench_ranking(n_filas: int, repeticiones: int = 20) -> None:
+    df = generar_resultado_sintetico(n_filas)
+    df["energaenerc_kcal"] = df["nutriente_0"] * 10
+    t_build = _medir(lambda: RankingNutrientes(df))
+    ranking = RankingNutrientes(df)
+
+    t_topk = _medir(lambda: [
+        ranking.top_k("nutriente_1", 20, base="kcal", ut=["UT_1"], grupo_etareo_recet=["3-5 AÑOS"])
+        for _ in range(repeticiones)
+    ]) / repeticiones
+
+    print(f"[ranking] filas={n_filas:,} recetas={len(ranking.recetas):,}")
+    print(f"  precálculo          : {t_build:8.2f} s")
+    print(f"  top-20 por 100 kcal : {t_topk * 1000:8.2f} ms")
+
+
+def bench_distribucion(n_filas: int, repeticiones: int = 20) -> None:
+    df = generar_resultado_sintetico(n_filas)
+    t_build = _medir(lambda: DistribucionNutrientes(df))
+    dist = DistribucionNutrientes(df)
+
+    filtros = {"ut": ["UT_1", "UT_2"], "grupo_etareo_recet": ["3-5 AÑOS"]}
+    t_consulta = _medir(lambda: [
+        (dist.histograma("nutriente_1", **filtros), dist.resumen("nutriente_1", meta=50.0, **filtros))
+        for _ in range(repeticiones)
+    ]) / repeticiones
+
+    print(f"[distribución] filas={n_filas:,} grupos={len(dist.grupos):,}")
+    print(f"  precálculo          : {t_build:8.2f} s")
+    print(f"  filtro + histograma : {t_consulta * 1000:8.2f} ms")
+
+
+def bench_compras(n_filas: int, filas_plan: int = 50_000, seed: int = 0) -> None:
+    df = generar_resultado_sintetico(n_filas)
+    t_build = _medir(lambda: PlanificadorCompras(df))
+    planificador = PlanificadorCompras(df)
+
+    rng = np.random.default_rng(seed)
+    plan = planificador.plantilla().sample(filas_plan, replace=True, random_state=seed).reset_index(drop=True)
+    plan["raciones"] = rng.integers(1, 500, len(plan))
+    t_plan = _medir(lambda: planificador.calcular(plan))
+
+    print(f"[compras] filas={n_filas:,} recetas={len(planificador.recetas):,} plan={filas_plan:,}")
+    print(f"  precálculo          : {t_build:8.2f} s")
+    print(f"  plan → gramos por UT: {t_plan * 1000:8.2f} ms")
+
+
+def bench_menu(n_filas: int, dias: int = 7) -> None:
+    df = generar_resultado_sintetico(n_filas)
+    totales = calculo.totales_por_receta(df)
+    totales = totales[totales["grupo_etareo_recet"] == "3-5 AÑOS"]
+    metas = {f"nutriente_{i}": 250.0 for i in range(5)}
+    costos = totales["nutriente_5"]
+
+    print(f"[menú] filas={n_filas:,} candidatas={len(totales):,} días={dias} límite={TIEMPO_LIMITE_S} s")
+    t0 = time.perf_counter()
+    _, _, estado = optimizar_menu(totales, metas, dias=dias, max_repeticiones=2, costos=costos)
+    t = time.perf_counter() - t0
+    print(
+        f"  optimizar_menu      : {t:8.2f} s | objetivo {estado['objetivo']:10.1f} | cota {estado['cota']:10.1f} "
+        f"| brecha {estado['brecha']:6.2%} | óptimo={estado['optimo']}"
+    )
+
+# ============================================================
+# 🍳 Escalado por peso y factores de retención
+# ============================================================
+def bench_escalado(n_filas: int, seed: int = 0) -> None:
+    df = generar_resultado_sintetico(n_filas, seed=seed)
+    nutri_cols = [c for c in df.columns if c.startswith("nutriente_")]
+    rng = np.random.default_rng(seed)
+    df["metodo_coccion"] = rng.choice(["HERVIDO", "FRITO", "HORNEADO", ""], n_filas)
+    grupos = df["grupo_alimento_tpca2017"].astype(str).str.upper().unique()
+    tabla = pd.DataFrame({"grupo": np.repeat(grupos, 2), "metodo": np.tile(["HERVIDO", ""], len(grupos))})
+    tabla["rendimiento"] = rng.uniform(0.8, 2.5, len(tabla))
+    for c in nutri_cols[:8]:
+        tabla[c] = rng.uniform(0.5, 1.0, len(tabla))
+    factores = FactoresRetencion(tabla, nutri_cols)
+
+    def _por_columna():
+        out = df.copy()
+        peso = pd.to_numeric(out["peso_neto__racion_g"], errors="coerce").fillna(0)
+        for col in nutri_cols:
+            out[col] = pd.to_numeric(out[col], errors="coerce") * (peso / 100)
+
+    def _matriz():
+        peso = pd.to_numeric(df["peso_neto__racion_g"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        valores = df[nutri_cols].to_numpy(dtype=float)
+        valores *= peso[:, None] / 100
+        return valores, peso
+
+    valores, peso = _matriz()
+    t_columna = _medir(_por_columna)
+    t_matriz = _medir(_matriz)
+    t_posiciones = _medir(lambda: factores.posiciones(
+        df["codigo_del_alimento_tpca_2017"], df["grupo_alimento_tpca2017"], df["metodo_coccion"]
+    ))
+    posiciones = factores.posiciones(df["codigo_del_alimento_tpca_2017"], df["grupo_alimento_tpca2017"], df["metodo_coccion"])
+    t_aplicar = _medir(lambda: factores.aplicar(valores, peso, posiciones))
+
+    print(f"[escalado] filas={n_filas:,} nutrientes={len(nutri_cols)} con factor={len(factores.nutrientes)}")
+    print(f"  bucle por columna   : {t_columna:8.2f} s")
+    print(f"  una matriz          : {t_matriz:8.2f} s")
+    print(f"  factores: búsqueda  : {t_posiciones:8.2f} s")
+    print(f"  factores: aplicar   : {t_aplicar:8.2f} s")
+
+# ============================================================
+# 🧱 Pipeline completo vs por bloques (tiempo y memoria pico)
+# ============================================================
+def _medir_memoria(fn) -> tuple[float, float]:
+    tracemalloc.start()
+    t = _medir(fn)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return t, pico / 1e6
+
+
+# Archivos de trabajo del pipeline que el benchmark redirige a un directorio temporal
+# (incluye la publicación: los dashboards abiertos no deben pasar al resultado sintético)
+RUTAS_PIPELINE = [
+    (calculo, "FILE_RECETAS", "recetas.csv"),
+    (calculo, "OUTPUT_FILE", "resultado.xlsx"),
+    (calculo, "PUBLICADO_PKL", "resultado.pkl"),
+    (calculo, "PUBLICADO_MANIFIESTO", "ultimo_resultado.json"),
+    (calculo, "PUBLICADO_DISTRIBUCIONES", "distribuciones.pkl"),
+    (almacen_resultados, "DB_PATH", "historial.sqlite"),
+]
+
+
+def bench_por_bloques(n_filas: int, chunksize: int = 20_000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        generar_recetas_sinteticas(n_filas).to_csv(tmp / "recetas.csv", index=False)
+        originales = [(modulo, nombre, getattr(modulo, nombre)) for modulo, nombre, _ in RUTAS_PIPELINE]
+        for modulo, nombre, archivo in RUTAS_PIPELINE:
+            setattr(modulo, nombre, tmp / archivo)
+        try:
+            t_full, m_full = _medir_memoria(calculo.calcular_info_nutricional)
+            t_blk, m_blk = _medir_memoria(lambda: calculo.calcular_info_nutricional_por_bloques(chunksize))
+        finally:
+            for modulo, nombre, valor in originales:
+                setattr(modulo, nombre, valor)
+
+    print(f"[pipeline] filas={n_filas:,} bloque={chunksize:,}")
+    print(f"  completo            : {t_full:8.2f} s | pico {m_full:10.1f} MB")
+    print(f"  por bloques         : {t_blk:8.2f} s | pico {m_blk:10.1f} MB")
+
+# ============================================================
+# 🚀 Ejecución
+# ============================================================
+if __name__ == "__main__":
+    tamanos = [int(x) for x in sys.argv[1:]] or [10_000, 100_000]
+    for n in tamanos:
+        bench_exportacion(n)
+        bench_ranking(n)
+        bench_distribucion(n)
+        bench_compras(n)
+        bench_menu(n)
+        bench_escalado(n)
+        bench_por_bloques(n)
@@ -16,7 +16,12 @@ DATA_PROCESSED.mkdir(parents=True, exist_ok=True)
 # ============================================================
 # 🧩 Limpieza única de la tabla
 # ============================================================
-def limpiar_tabla_peruana():
+def limpiar_tabla_peruana(output_path=None):
+    """
+    Genera data/processed/tablas_peruanas_clean.csv en el formato que espera cargar_tpca:
+    separador ';', columna 'codigo' y nutrientes con la unidad como sufijo (Ej: energaenerc_KCAL).
+    Con `output_path` escribe en otra ruta (p. ej. un temporal a validar antes de reemplazar).
+    """
     file = DATA_RAW / "TABLAS_PERUANAS_DE_COMPOSICIÓN_DE_alimentos 2017.xlsx"
 
     if not file.exists():
@@ -34,14 +39,21 @@ def limpiar_tabla_peruana():
     # ============================================================
     # 🧼 Limpieza
     # ============================================================
+    # La primera fila trae las unidades (kcal, g, mg, µg): pasan a sufijo de los nutrientes
+    unidades = df.iloc[0].fillna("").astype(str).str.strip().str.upper()
+    df = df.iloc[1:]
+
     # Estandarizar nombres de columnas
-    df.columns = (
+    columnas = (
         df.columns.astype(str)
         .str.strip()
         .str.lower()
         .str.replace(" ", "_")
         .str.replace("[^a-z0-9_]", "", regex=True)
+        .str.strip("_")
     )
+    df.columns = [c if i < 3 else f"{c}_{u}" for i, (c, u) in enumerate(zip(columnas, unidades))]
+    df = df.rename(columns={"cdigo": "codigo"})
 
     # Eliminar filas vacías o duplicadas
     df = df.dropna(how="all").drop_duplicates()
@@ -53,8 +65,8 @@ def limpiar_tabla_peruana():
     # ============================================================
     # 💾 Guardar
     # ============================================================
-    output_path = DATA_PROCESSED / "tablas_peruanas_clean.csv"
-    df.to_csv(output_path, index=False)
+    output_path = output_path or DATA_PROCESSED / "tablas_peruanas_clean.csv"
+    df.to_csv(output_path, sep=";", index=False, float_format="%g")
     print(f"✅ Limpieza completada. Archivo guardado en: {output_path}")
     print(f"📊 Filas finales: {len(df)} | Columnas: {len(df.columns)}")
 
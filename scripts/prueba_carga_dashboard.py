@@ -0,0 +1,172 @@
+# ============================================================
+# 🚦 Prueba de carga del dashboard (sesiones concurrentes, sin navegador)
+# Cada sesión simulada es un proceso que ejecuta app.py con streamlit.testing
+# y recorre: carga → cálculo → filtros → raciones → receta → descarga
+# Uso: python scripts/prueba_carga_dashboard.py --sesiones 30 --filas 2000 20000
+# ============================================================
+
+import argparse
+import contextlib
+import io
+import multiprocessing as mp
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+APP_FILE = BASE_DIR / "app.py"
+sys.path.insert(0, str(BASE_DIR))
+sys.path.insert(0, str(BASE_DIR / "scripts"))
+
+PASOS = ["inicio", "carga", "calculo", "filtros", "raciones", "receta", "descarga"]
+
+# ============================================================
+# 🧪 Sesión simulada (se ejecuta en un proceso propio)
+# ============================================================
+def _aislar_rutas(tmp: Path) -> None:
+    """Redirige archivos de trabajo a un directorio propio de la sesión (sin carreras entre procesos)."""
+    import almacen_resultados
+    import calculo_nutricional_recetas as calculo
+    import clean_recetas_calculo as limpieza
+
+    limpieza.DATA_PROCESSED = tmp
+    limpieza.REPORTS_DIR = tmp
+    calculo.FILE_RECETAS = tmp / "recetas_calculo_clean.csv"
+    calculo.OUTPUT_FILE = tmp / "recetas_calculo_nutricional.xlsx"
+    calculo.PUBLICADO_PKL = tmp / "recetas_calculo_nutricional.pkl"
+    calculo.PUBLICADO_MANIFIESTO = tmp / "ultimo_resultado.json"
+    calculo.PUBLICADO_DISTRIBUCIONES = tmp / "distribuciones.pkl"
+    almacen_resultados.DB_PATH = tmp / "historial_resultados.sqlite"
+
+
+def _widget(elementos, etiqueta):
+    for e in elementos:
+        if e.label == etiqueta:
+            return e
+    raise LookupError(f"No se encontró el control '{etiqueta}'")
+
+
+def _sesion(args) -> dict:
+    sesion, xlsx, iteraciones, barrera, timeout = args
+    from streamlit.testing.v1 import AppTest
+    from clean_recetas_calculo import limpiar_recetas
+
+    rng = np.random.default_rng(sesion)
+    latencias = {p: [] for p in PASOS}
+    errores = []
+
+    # Los print del pipeline se descartan para no mezclar la salida de las sesiones
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        _aislar_rutas(Path(tmp))
+        at = AppTest.from_file(str(APP_FILE), default_timeout=timeout)
+
+        def medir(paso, fn):
+            t0 = time.perf_counter()
+            try:
+                fn()
+                if at.exception:
+                    errores.append(f"{paso}: {at.exception[0].value}")
+            except Exception as e:  # la sesión sigue: se reporta el error
+                errores.append(f"{paso}: {e}")
+            latencias[paso].append(time.perf_counter() - t0)
+
+        barrera.wait()
+        uso_inicio = resource.getrusage(resource.RUSAGE_SELF)
+
+        medir("inicio", at.run)
+        # AppTest no soporta file_uploader: se ejecuta la misma limpieza que dispara la subida
+        medir("carga", lambda: limpiar_recetas(Path(xlsx)))
+        medir("calculo", lambda: at.sidebar.button[0].click().run())
+
+        for _ in range(iteraciones):
+            def _filtros():
+                ut = _widget(at.multiselect, "UT")
+                ut.set_value(list(rng.choice(ut.options, size=min(2, len(ut.options)), replace=False))).run()
+            medir("filtros", _filtros)
+            medir("raciones", lambda: at.number_input(key="raciones_resumen").set_value(int(rng.integers(1, 50))).run())
+
+            def _receta():
+                sel = _widget(at.selectbox, "Seleccionar receta")
+                sel.set_value(sel.options[int(rng.integers(0, len(sel.options)))]).run()
+            medir("receta", _receta)
+            # El Excel de descarga se arma en cada rerun: este rerun mide la exportación
+            medir("descarga", at.run)
+
+        uso_fin = resource.getrusage(resource.RUSAGE_SELF)
+
+    return {
+        "sesion": sesion,
+        "latencias": latencias,
+        "cpu_s": (uso_fin.ru_utime - uso_inicio.ru_utime) + (uso_fin.ru_stime - uso_inicio.ru_stime),
+        "rss_pico_mb": uso_fin.ru_maxrss / 1024,  # Linux: KB
+        "errores": errores,
+    }
+
+# ============================================================
+# 📊 Escenario y reporte
+# ============================================================
+def ejecutar_escenario(n_sesiones: int, n_filas: int, iteraciones: int, timeout: float) -> pd.DataFrame:
+    from benchmark_pipeline import generar_recetas_sinteticas
+
+    with tempfile.TemporaryDirectory() as tmp:
+        xlsx = Path(tmp) / "recetas_calculo.xlsx"
+        generar_recetas_sinteticas(n_filas).to_excel(xlsx, index=False)
+
+        ctx = mp.get_context("spawn")
+        with ctx.Manager() as manager:
+            barrera = manager.Barrier(n_sesiones)
+            t0 = time.perf_counter()
+            with ctx.Pool(n_sesiones) as pool:
+                resultados = pool.map(_sesion, [(i, str(xlsx), iteraciones, barrera, timeout) for i in range(n_sesiones)])
+            total = time.perf_counter() - t0
+
+    filas = []
+    for paso in PASOS:
+        valores = np.concatenate([r["latencias"][paso] for r in resultados]) * 1000
+        if len(valores) == 0:
+            continue
+        p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+        filas.append({"paso": paso, "n": len(valores), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99})
+    reruns = np.concatenate([np.concatenate(list(r["latencias"].values())) for r in resultados]) * 1000
+    filas.append({"paso": "TODOS", "n": len(reruns), **dict(zip(["p50_ms", "p95_ms", "p99_ms"],
+                                                               np.percentile(reruns, [50, 95, 99])))})
+
+    df = pd.DataFrame(filas)
+    df.insert(0, "filas", n_filas)
+    df.insert(0, "sesiones", n_sesiones)
+    df["cpu_s_por_sesion"] = np.mean([r["cpu_s"] for r in resultados])
+    df["rss_pico_mb"] = max(r["rss_pico_mb"] for r in resultados)
+    df["duracion_s"] = total
+
+    errores = [e for r in resultados for e in r["errores"]]
+    print(f"\n[carga] sesiones={n_sesiones} filas={n_filas:,} duración={total:.1f} s errores={len(errores)}")
+    print(df[["paso", "n", "p50_ms", "p95_ms", "p99_ms"]].round(1).to_string(index=False))
+    print(f"  CPU por sesión: {df['cpu_s_por_sesion'].iloc[0]:.1f} s | RSS pico: {df['rss_pico_mb'].iloc[0]:.0f} MB")
+    for e in errores[:5]:
+        print(f"  ⚠️ {e}")
+    return df
+
+# ============================================================
+# 🚀 Ejecución
+# ============================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga headless del dashboard Streamlit.")
+    parser.add_argument("--sesiones", type=int, nargs="+", default=[5], help="Sesiones concurrentes por escenario")
+    parser.add_argument("--filas", type=int, nargs="+", default=[2_000], help="Filas de ingredientes por escenario")
+    parser.add_argument("--iteraciones", type=int, default=3, help="Ciclos filtros/raciones/receta/descarga por sesión")
+    parser.add_argument("--timeout", type=float, default=300, help="Tiempo máximo por rerun (s)")
+    parser.add_argument("--salida", type=Path, default=None, help="CSV con los resultados")
+    args = parser.parse_args()
+
+    reporte = pd.concat(
+        [ejecutar_escenario(s, f, args.iteraciones, args.timeout) for f in args.filas for s in args.sesiones],
+        ignore_index=True,
+    )
+    if args.salida:
+        reporte.to_csv(args.salida, index=False)
+        print(f"\n✅ Resultados guardados en: {args.salida}")
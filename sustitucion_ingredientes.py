@@ -0,0 +1,199 @@
+# ============================================================
+# 🔁 Simulador de sustitución de ingredientes
+# "¿Qué pasa con cada receta si reemplazamos el alimento X por el Y?"
+# Recalcula solo las filas que usan el alimento (deltas incrementales)
+# ============================================================
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from calculo_nutricional_recetas import (
+    CLAVES_RECETA,
+    COL_CODIGO_RECETA,
+    COL_CODIGO_TPCA,
+    COL_GRUPO_RECETA,
+    COL_GRUPO_TPCA,
+    COL_PESO,
+    normalize_code,
+)
+from factores_retencion import COL_METODO, COL_PESO_COCIDO, SUFIJO_RETENIDO, FactoresRetencion
+
+# Columnas esperadas en cada sustitución candidata
+COLUMNAS_SUSTITUCION = ["codigo_origen", "grupo_origen", "codigo_destino", "grupo_destino", "factor"]
+
+
+def _normalizar_claves(codigos: pd.Series, grupos: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Normaliza código y grupo aplicando normalize_code solo sobre los valores únicos."""
+    codigos = codigos.astype(object)
+    uniq = pd.unique(codigos)
+    mapa = dict(zip(uniq, (normalize_code(x) for x in uniq)))
+    return (
+        codigos.map(mapa).to_numpy(dtype=object),
+        grupos.astype(str).str.strip().str.upper().to_numpy(dtype=object),
+    )
+
+
+class SimuladorSustitucion:
+    """
+    Precalcula sobre `df_final` (resultado por ingrediente de calcular_info_nutricional):
+    - el identificador de receta de cada fila y los totales actuales por receta
+    - un índice (código, grupo) → posiciones de las filas que usan ese alimento
+    - la matriz de la TPCA por 100 g indexada por (código, grupo)
+
+    Con `factores` (tabla de factores de retención con la que se calculó el resultado), las columnas
+    `<nutriente>_retenido` y `peso_cocido_g` del resultado también se recalculan con los factores
+    del alimento destino y el método de cocción de cada fila (`metodo_coccion`; obligatorio si la tabla
+    de factores distingue métodos).
+
+    Con eso cada sustitución solo toca las filas afectadas.
+    """
+
+    def __init__(
+        self,
+        df_final: pd.DataFrame,
+        df_tpca: pd.DataFrame,
+        nutri_cols: list[str],
+        factores: FactoresRetencion | None = None,
+    ):
+        self.nutri_cols = [c for c in nutri_cols if c in df_final.columns and c in df_tpca.columns]
+        if not self.nutri_cols:
+            raise ValueError("No hay columnas nutricionales comunes entre el resultado y la TPCA.")
+        for col in [COL_CODIGO_RECETA, COL_GRUPO_RECETA, COL_PESO]:
+            if col not in df_final.columns:
+                raise ValueError(f"❌ No se encontró la columna '{col}' en el resultado.")
+        self.claves_receta = [c for c in CLAVES_RECETA if c in df_final.columns]
+        if not self.claves_receta:
+            raise ValueError("No se detectaron columnas de identificación de receta.")
+
+        # Nutrientes retenidos del resultado: (nutriente crudo en nutri_cols, columna en la matriz de factores)
+        self.factores = factores
+        self._retenidos = []
+        if factores is not None:
+            self._retenidos = [
+                (self.nutri_cols.index(n), j, n + SUFIJO_RETENIDO)
+                for j, n in enumerate(factores.nutrientes)
+                if n in self.nutri_cols and n + SUFIJO_RETENIDO in df_final.columns
+            ]
+        self._con_peso_cocido = factores is not None and factores.con_rendimiento and COL_PESO_COCIDO in df_final.columns
+        # Columnas de los deltas: crudos, peso cocido y retenidos
+        self.columnas = (
+            self.nutri_cols
+            + ([COL_PESO_COCIDO] if self._con_peso_cocido else [])
+            + [col for _, _, col in self._retenidos]
+        )
+        self.metodos = (
+            df_final[COL_METODO].to_numpy(dtype=object) if factores is not None and COL_METODO in df_final.columns else None
+        )
+        if len(self.columnas) > len(self.nutri_cols) and factores.con_metodo and self.metodos is None:
+            raise ValueError(
+                f"❌ La tabla de factores distingue métodos de cocción pero el resultado no tiene la columna "
+                f"'{COL_METODO}': los retenidos no se pueden recalcular."
+            )
+
+        # Receta de cada fila + totales actuales
+        grupos_receta = df_final.groupby(self.claves_receta, sort=False, dropna=False)
+        self.receta_id = grupos_receta.ngroup().to_numpy()
+        self.recetas = grupos_receta.size().reset_index(name="n_ingredientes")[self.claves_receta]
+        self.valores = np.nan_to_num(
+            df_final[self.columnas].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        )
+        self.totales = np.zeros((len(self.recetas), len(self.columnas)))
+        np.add.at(self.totales, self.receta_id, self.valores)
+        self.peso = pd.to_numeric(df_final[COL_PESO], errors="coerce").fillna(0).to_numpy(dtype=float)
+
+        # Índice alimento → filas
+        codigos, grupos = _normalizar_claves(df_final[COL_CODIGO_RECETA], df_final[COL_GRUPO_RECETA])
+        claves = pd.MultiIndex.from_arrays([codigos, grupos])
+        self.filas_por_alimento = pd.Series(np.arange(len(df_final))).groupby(claves).indices
+
+        # TPCA por 100 g
+        cod_tp, grp_tp = _normalizar_claves(df_tpca[COL_CODIGO_TPCA], df_tpca[COL_GRUPO_TPCA])
+        matriz = df_tpca[self.nutri_cols].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        self.tpca_idx = {k: i for i, k in enumerate(zip(cod_tp, grp_tp))}
+        self.tpca_claves = (cod_tp, grp_tp)
+        self.tpca_100g = np.nan_to_num(matriz)
+
+    # ------------ consultas ------------
+    def alimentos_usados(self) -> list[tuple[str, str]]:
+        """Pares (código, grupo) presentes en las recetas."""
+        return sorted(self.filas_por_alimento)
+
+    def simular(self, sustituciones, incluir_totales: bool = True) -> pd.DataFrame:
+        """
+        Evalúa un lote de sustituciones candidatas en una sola pasada.
+
+        `sustituciones`: DataFrame o lista de dicts con codigo_origen, grupo_origen,
+        codigo_destino, grupo_destino y factor (opcional, multiplica el peso; por defecto 1).
+
+        Devuelve una fila por (candidato, receta afectada) con el delta de cada nutriente
+        (y, con factores, del peso cocido y de cada nutriente retenido) y, si `incluir_totales`,
+        las columnas `<nutriente>_actual` y `<nutriente>_nuevo`.
+        """
+        cand = pd.DataFrame(sustituciones).reset_index(drop=True)
+        faltantes = [c for c in COLUMNAS_SUSTITUCION[:4] if c not in cand.columns]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en las sustituciones: {faltantes}")
+        if "factor" not in cand.columns:
+            cand["factor"] = 1.0
+        cand["factor"] = pd.to_numeric(cand["factor"], errors="coerce").fillna(1.0)
+        cand["codigo_origen"], cand["grupo_origen"] = _normalizar_claves(cand["codigo_origen"], cand["grupo_origen"])
+        cand["codigo_destino"], cand["grupo_destino"] = _normalizar_claves(cand["codigo_destino"], cand["grupo_destino"])
+
+        filas, candidato, destino, factor = [], [], [], []
+        vacio = np.empty(0, dtype=np.int64)
+        for i, s in enumerate(cand.itertuples(index=False)):
+            clave_destino = (s.codigo_destino, s.grupo_destino)
+            if clave_destino not in self.tpca_idx:
+                raise ValueError(f"El alimento destino {clave_destino} no existe en la TPCA.")
+            pos = self.filas_por_alimento.get((s.codigo_origen, s.grupo_origen), vacio)
+            filas.append(pos)
+            candidato.append(np.full(len(pos), i))
+            destino.append(np.full(len(pos), self.tpca_idx[clave_destino]))
+            factor.append(np.full(len(pos), s.factor))
+
+        filas = np.concatenate(filas) if filas else vacio
+        columnas = ["candidato"] + COLUMNAS_SUSTITUCION + self.claves_receta + ["ingredientes_afectados"]
+        if len(filas) == 0:
+            return pd.DataFrame(columns=columnas + self.columnas)
+        candidato = np.concatenate(candidato)
+        destino = np.concatenate(destino)
+        factor = np.concatenate(factor)
+
+        # Delta por fila afectada: nuevo alimento escalado por peso·factor − valor actual
+        peso = self.peso[filas] * factor
+        nuevos = self.tpca_100g[destino] * (peso[:, None] / 100.0)
+        if self.columnas != self.nutri_cols:
+            # Factores del alimento destino (y método de cocción de la fila) sobre los valores nuevos
+            cod_tp, grp_tp = self.tpca_claves
+            metodos = self.metodos[filas] if self.metodos is not None else None
+            pos = self.factores.posiciones(cod_tp[destino], grp_tp[destino], metodos)
+            bloques = [nuevos]
+            if self._con_peso_cocido:
+                bloques.append((peso * self.factores.rendimiento[pos])[:, None])
+            if self._retenidos:
+                crudo, fac, _ = (np.array(x) for x in zip(*self._retenidos))
+                bloques.append(self.factores.matriz[pos[:, None], fac] * nuevos[:, crudo])
+            nuevos = np.hstack(bloques)
+        delta = nuevos - self.valores[filas]
+
+        # Agregación por (candidato, receta)
+        n_recetas = len(self.recetas)
+        clave = candidato * n_recetas + self.receta_id[filas]
+        uniq, inv = np.unique(clave, return_inverse=True)
+        delta_receta = np.zeros((len(uniq), len(self.columnas)))
+        np.add.at(delta_receta, inv, delta)
+        afectados = np.bincount(inv, minlength=len(uniq))
+
+        cand_id, receta_id = np.divmod(uniq, n_recetas)
+        out = cand.iloc[cand_id][COLUMNAS_SUSTITUCION].reset_index(drop=True)
+        out.insert(0, "candidato", cand_id)
+        out = pd.concat([out, self.recetas.iloc[receta_id].reset_index(drop=True)], axis=1)
+        out["ingredientes_afectados"] = afectados
+        out[self.columnas] = delta_receta
+        if incluir_totales:
+            actual = self.totales[receta_id]
+            out[[f"{c}_actual" for c in self.columnas]] = actual
+            out[[f"{c}_nuevo" for c in self.columnas]] = actual + delta_receta
+        return out
@@ -0,0 +1,184 @@
+# ============================================================
+# 👀 Modo vigilancia: procesa automáticamente los Excel nuevos en data/raw
+# limpieza → cálculo → publicación para el dashboard
+# Uso: python vigilar_datos.py [--tpca] [--bloques N] [--intervalo S] [--espera S] [--una-vez]
+# ============================================================
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import calculo_nutricional_recetas as calculo
+from clean_recetas_calculo import limpiar_recetas, limpiar_recetas_por_bloques
+
+# ============================================================
+# 📂 Rutas
+# ============================================================
+BASE_DIR = Path(__file__).resolve().parent
+DATA_RAW = BASE_DIR / "data" / "raw"
+DATA_PROCESSED = BASE_DIR / "data" / "processed"
+TPCA_RAW = DATA_RAW / "TABLAS_PERUANAS_DE_COMPOSICIÓN_DE_alimentos 2017.xlsx"
+ESTADO_FILE = DATA_PROCESSED / "vigilancia_estado.json"
+
+# ============================================================
+# 🧩 Estado (firmas y hashes de lo ya procesado)
+# ============================================================
+def _cargar_estado() -> dict:
+    if ESTADO_FILE.exists():
+        return json.loads(ESTADO_FILE.read_text(encoding="utf-8"))
+    return {"firmas": {}, "hashes": {}, "ultimo_recetas": None}
+
+
+def _guardar_estado(estado: dict) -> None:
+    temporal = ESTADO_FILE.with_suffix(".tmp")
+    temporal.write_text(json.dumps(estado, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(temporal, ESTADO_FILE)
+
+
+def hash_archivo(path: Path) -> str:
+    """SHA-256 del contenido, leído por bloques."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _firma(path: Path) -> list:
+    st = path.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _archivos_observados(incluir_tpca: bool) -> list[Path]:
+    archivos = [
+        p for p in sorted(DATA_RAW.glob("*.xlsx"))
+        if not p.name.startswith("~$") and p != TPCA_RAW
+    ]
+    if incluir_tpca and TPCA_RAW.exists():
+        archivos.insert(0, TPCA_RAW)
+    return archivos
+
+# ============================================================
+# ⚙️ Procesamiento
+# ============================================================
+def _procesar_recetas(path: Path, chunksize: int | None) -> None:
+    print(f"\n🍽️ [{datetime.now():%H:%M:%S}] Procesando recetas: {path.name}")
+    if chunksize:
+        limpiar_recetas_por_bloques(path, chunksize)
+        calculo.calcular_info_nutricional_por_bloques(chunksize)
+    else:
+        limpiar_recetas(path)
+        calculo.calcular_info_nutricional()
+
+
+def _procesar_tpca() -> None:
+    print(f"\n📘 [{datetime.now():%H:%M:%S}] Cambió la TPCA: limpiando y recompilando...")
+    sys.path.insert(0, str(BASE_DIR / "scripts"))
+    from clean_tablas_peruanas import limpiar_tabla_peruana
+
+    # Se limpia a un temporal y solo se reemplaza la TPCA vigente si se puede leer como tal
+    temporal = calculo.FILE_TPCA.with_suffix(".tmp")
+    try:
+        limpiar_tabla_peruana(temporal)
+        _, nutri_cols = calculo._leer_tpca_csv(temporal)
+        if not nutri_cols:
+            raise ValueError("La TPCA regenerada no tiene columnas nutricionales.")
+    except Exception:
+        temporal.unlink(missing_ok=True)
+        raise
+    os.replace(temporal, calculo.FILE_TPCA)
+    calculo.compilar_tpca()
+
+
+def procesar_si_cambio(path: Path, estado: dict, chunksize: int | None = None) -> bool:
+    """
+    Procesa `path` si su contenido cambió desde la última vez (hash SHA-256).
+    Devuelve True si se procesó. Si la TPCA cambió, se recalcula el último libro de recetas.
+    """
+    clave = str(path)
+    firma = _firma(path)
+    digest = hash_archivo(path)
+    if estado["hashes"].get(clave) == digest:
+        estado["firmas"][clave] = firma
+        print(f"⏭️ Sin cambios de contenido: {path.name}")
+        return False
+
+    # La firma se guarda aunque falle: se reintenta solo cuando el archivo vuelva a cambiar
+    estado["firmas"][clave] = firma
+    try:
+        if path == TPCA_RAW:
+            _procesar_tpca()
+            ultimo = estado.get("ultimo_recetas")
+            if ultimo and Path(ultimo).exists():
+                _procesar_recetas(Path(ultimo), chunksize)
+        else:
+            _procesar_recetas(path, chunksize)
+            estado["ultimo_recetas"] = clave
+    except Exception as e:
+        print(f"❌ Error procesando {path.name}: {e}")
+        _guardar_estado(estado)
+        return False
+
+    estado["hashes"][clave] = digest
+    _guardar_estado(estado)
+    print(f"✅ Resultado publicado ({path.name})")
+    return True
+
+
+def vigilar(intervalo: float = 2.0, espera: float = 5.0, incluir_tpca: bool = False,
+            chunksize: int | None = None, una_vez: bool = False) -> None:
+    """
+    Revisa data/raw cada `intervalo` segundos. Un archivo se procesa cuando su firma
+    (mtime + tamaño) se mantiene estable durante `espera` segundos (antirrebote), así no
+    se lee un Excel a medio copiar. Con `una_vez` hace una sola pasada sin esperar.
+    """
+    estado = _cargar_estado()
+    if incluir_tpca and not calculo.TPCA_COMPILADA.exists() and calculo.FILE_TPCA.exists():
+        calculo.compilar_tpca()
+
+    pendientes: dict[str, tuple[list, float]] = {}
+    print(f"👀 Vigilando {DATA_RAW} (intervalo {intervalo}s, espera {espera}s). Ctrl+C para salir.")
+    try:
+        while True:
+            ahora = time.monotonic()
+            for path in _archivos_observados(incluir_tpca):
+                clave = str(path)
+                try:
+                    firma = _firma(path)
+                except FileNotFoundError:
+                    continue
+                if estado["firmas"].get(clave) == firma:
+                    pendientes.pop(clave, None)
+                    continue
+                if not una_vez:
+                    previo = pendientes.get(clave)
+                    if previo is None or previo[0] != firma:
+                        pendientes[clave] = (firma, ahora)
+                        continue
+                    if ahora - previo[1] < espera:
+                        continue
+                pendientes.pop(clave, None)
+                procesar_si_cambio(path, estado, chunksize)
+            if una_vez:
+                break
+            time.sleep(intervalo)
+    except KeyboardInterrupt:
+        print("\n👋 Vigilancia detenida.")
+
+# ============================================================
+# 🚀 Ejecución directa
+# ============================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Procesa automáticamente los Excel de recetas en data/raw.")
+    parser.add_argument("--tpca", action="store_true", help="Vigilar también el Excel original de la TPCA")
+    parser.add_argument("--bloques", type=int, default=None, help="Procesar por bloques de N filas")
+    parser.add_argument("--intervalo", type=float, default=2.0, help="Segundos entre revisiones")
+    parser.add_argument("--espera", type=float, default=5.0, help="Segundos de estabilidad antes de procesar")
+    parser.add_argument("--una-vez", action="store_true", help="Una sola pasada (p. ej. desde cron)")
+    args = parser.parse_args()
+    vigilar(args.intervalo, args.espera, args.tpca, args.bloques, args.una_vez)